@@ -0,0 +1,65 @@
+"""
+Precomputed target squares for every piece on every square, built once
+at import so move generation never has to bounds check an offset again
+
+Squares are numbered y * 8 + x. Each table is given both as ordered
+lists of square numbers and as bitboards (bit y * 8 + x).
+"""
+
+#The (y, x) coordinate of every square
+SQUARE_COORDS = [divmod(square, 8) for square in range(64)]
+#Ray directions as (y, x) steps, the first four walk towards higher squares
+NORTH, NORTH_EAST, NORTH_WEST, EAST, SOUTH, SOUTH_EAST, SOUTH_WEST, WEST = range(8)
+DIRECTIONS = [(1, 0), (1, 1), (1, -1), (0, 1), (-1, 0), (-1, 1), (-1, -1), (0, -1)]
+#The direction number of each (y, x) step
+DIRECTION_INDEX = {step: direction for direction, step in enumerate(DIRECTIONS)}
+ORTHOGONAL = (NORTH, EAST, SOUTH, WEST)
+DIAGONAL = (NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST)
+ALL_DIRECTIONS = tuple(range(8))
+KNIGHT_STEPS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)]
+
+
+def _targets(square: int, steps) -> list[int]:
+    """returns the squares one step away in each (y, x) step that are on the board"""
+    y, x = SQUARE_COORDS[square]
+    return [(y + y_d) * 8 + x + x_d for y_d, x_d in steps
+            if 0 <= y + y_d <= 7 and 0 <= x + x_d <= 7]
+
+
+def _ray(square: int, direction: int) -> list[int]:
+    """returns every square from a square to the edge in one direction, nearest first"""
+    y, x = SQUARE_COORDS[square]
+    y_d, x_d = DIRECTIONS[direction]
+    ray = []
+    y, x = y + y_d, x + x_d
+    while 0 <= y <= 7 and 0 <= x <= 7:
+        ray.append(y * 8 + x)
+        y, x = y + y_d, x + x_d
+    return ray
+
+
+def to_mask(squares) -> int:
+    """returns the bitboard with the bit of every square set"""
+    bits = 0
+    for square in squares:
+        bits |= 1 << square
+    return bits
+
+
+#Knight and king target squares of every square
+KNIGHT_TARGETS = [_targets(square, KNIGHT_STEPS) for square in range(64)]
+KING_TARGETS = [_targets(square, DIRECTIONS) for square in range(64)]
+#The ordered squares of each ray, indexed [direction][square]
+RAY_SQUARES = [[_ray(square, direction) for square in range(64)] for direction in range(8)]
+#Pawn pushes (one then two squares) and diagonals, indexed [color value][square],
+#white pawns move up the board (+y) and black pawns move down it
+PAWN_PUSHES = [[RAY_SQUARES[NORTH][square][:2] for square in range(64)],
+               [RAY_SQUARES[SOUTH][square][:2] for square in range(64)]]
+PAWN_CAPTURES = [[_targets(square, [(1, -1), (1, 1)]) for square in range(64)],
+                 [_targets(square, [(-1, -1), (-1, 1)]) for square in range(64)]]
+
+#The same tables as bitboards
+KNIGHT_MASKS = [to_mask(targets) for targets in KNIGHT_TARGETS]
+KING_MASKS = [to_mask(targets) for targets in KING_TARGETS]
+PAWN_CAPTURE_MASKS = [[to_mask(targets) for targets in color] for color in PAWN_CAPTURES]
+RAYS = [[to_mask(ray) for ray in direction] for direction in RAY_SQUARES]
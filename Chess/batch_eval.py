@@ -0,0 +1,174 @@
+"""
+Evaluates many positions at once with NumPy, for offline analysis. The
+positions are packed into an (N, 64) array of piece codes (see
+piece_codes) and every term is worked out for the whole batch together.
+
+The material, piece-square and pawn structure terms (doubled, isolated
+and passed pawns, weighted as in pawn_hash) give exactly what
+evaluation.evaluate gives. On top of them comes mobility, counted as the
+empty squares each knight, bishop, rook and queen can reach.
+
+    python batch_eval.py [positions]
+"""
+import time
+import numpy as np
+from piece_codes import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KIND_MASK, BLACK
+from attack_tables import KNIGHT_TARGETS, DIRECTIONS, ORTHOGONAL
+from evaluation import MG_SCORES, EG_SCORES, PHASES, PHASE_TOTAL
+from pawn_hash import DOUBLED_PAWN, ISOLATED_PAWN
+import pawn_hash
+
+#Centipawns for each empty square a piece can reach, indexed by kind
+MOBILITY_WEIGHTS = np.zeros(8, dtype=np.int32)
+MOBILITY_WEIGHTS[KNIGHT] = 4
+MOBILITY_WEIGHTS[BISHOP] = 4
+MOBILITY_WEIGHTS[ROOK] = 2
+MOBILITY_WEIGHTS[QUEEN] = 1
+PASSED_PAWN = np.array(pawn_hash.PASSED_PAWN, dtype=np.int32)
+#How many positions are worked on at a time, bounding the memory used
+CHUNK = 16384
+
+_PHASES = np.array(PHASES, dtype=np.int32)
+_SQUARES = np.arange(64)
+#The squares a knight on each square jumps to
+#(in floating point, as NumPy only multiplies float matrices quickly)
+_KNIGHT_MATRIX = np.zeros((64, 64), dtype=np.float32)
+for _square, _targets in enumerate(KNIGHT_TARGETS):
+    _KNIGHT_MATRIX[_square, _targets] = 1
+
+
+def _shift(boards: np.ndarray, dy: int, dx: int) -> np.ndarray:
+    """returns (N, 8, 8) boards with everything moved dy rows and dx files,
+    whatever moves off the edge is lost"""
+    shifted = np.zeros_like(boards)
+    shifted[:, max(dy, 0):8 + min(dy, 0), max(dx, 0):8 + min(dx, 0)] = \
+        boards[:, max(-dy, 0):8 + min(-dy, 0), max(-dx, 0):8 + min(-dx, 0)]
+    return shifted
+
+
+def pack(positions) -> tuple[np.ndarray, np.ndarray]:
+    """returns the (N, 64) piece codes and the (N,) black to move flags of
+    65 byte Game.position() snapshots"""
+    data = np.frombuffer(b''.join(positions), dtype=np.uint8).reshape(-1, 65)
+    return data[:, :64].copy(), data[:, 64].astype(bool)
+
+
+def pack_games(games) -> tuple[np.ndarray, np.ndarray]:
+    """returns the (N, 64) piece codes and the (N,) black to move flags of Games"""
+    return pack([game.position() for game in games])
+
+
+def material(codes: np.ndarray) -> np.ndarray:
+    """returns the tapered material and piece-square score for white of each position"""
+    #the scores are read as they are now, since tuner.install changes them in place
+    middlegame = np.array(MG_SCORES, dtype=np.int32)[codes, _SQUARES].sum(axis=1)
+    endgame = np.array(EG_SCORES, dtype=np.int32)[codes, _SQUARES].sum(axis=1)
+    phase = np.minimum(_PHASES[codes].sum(axis=1), PHASE_TOTAL)
+    return (middlegame * phase + endgame * (PHASE_TOTAL - phase)) // PHASE_TOTAL
+
+
+def mobility(codes: np.ndarray) -> np.ndarray:
+    """returns the weighted count of empty squares the knights, bishops,
+    rooks and queens can reach, white's less black's"""
+    kinds = codes & KIND_MASK
+    empty = codes == 0
+    #every piece's weight, negative for black, so the squares reached add up as the score
+    weights = MOBILITY_WEIGHTS[kinds] * np.where(codes & BLACK, -1, 1).astype(np.int32)
+    #the knights' weights spread to the squares they jump to
+    knights = np.where(kinds == KNIGHT, weights, 0).astype(np.float32)
+    score = ((knights @ _KNIGHT_MATRIX) * empty).sum(axis=1).round().astype(np.int32)
+    #the sliders' weights slide along each ray until they reach a piece,
+    #small enough to add up in 16 bits square by square
+    empty = empty.reshape(-1, 8, 8).astype(np.int16)
+    reached = np.zeros(empty.shape, dtype=np.int16)
+    for direction, (dy, dx) in enumerate(DIRECTIONS):
+        slides = (kinds == QUEEN) | (kinds == (ROOK if direction in ORTHOGONAL else BISHOP))
+        front = np.where(slides, weights, 0).astype(np.int16).reshape(-1, 8, 8)
+        for _ in range(7):
+            front = _shift(front, dy, dx)
+            front *= empty
+            reached += front
+    return score + reached.sum(axis=(1, 2), dtype=np.int32)
+
+
+def pawn_structure(codes: np.ndarray) -> np.ndarray:
+    """returns the doubled, isolated and passed pawn score, white's less black's"""
+    pawns = (codes & KIND_MASK) == PAWN
+    white = (pawns & (codes & BLACK == 0)).reshape(-1, 8, 8)
+    black = (pawns & (codes & BLACK != 0)).reshape(-1, 8, 8)
+    score = np.zeros(len(codes), dtype=np.int32)
+    for own, enemy, sign in ((white, black, 1), (black, white[:, ::-1], -1)):
+        files = own.sum(axis=1)
+        doubled = np.maximum(files - 1, 0).sum(axis=1)
+        occupied = files > 0
+        neighbours = np.zeros_like(occupied)
+        neighbours[:, 1:] |= occupied[:, :-1]
+        neighbours[:, :-1] |= occupied[:, 1:]
+        isolated = (files * ~neighbours).sum(axis=1)
+        #seen from the pawn's side, rows count up the board in the direction it moves
+        rows = own if sign == 1 else own[:, ::-1]
+        blockers = enemy.copy()
+        blockers[:, :, 1:] |= enemy[:, :, :-1]
+        blockers[:, :, :-1] |= enemy[:, :, 1:]
+        #an enemy pawn on this or a neighbouring file anywhere further up the board
+        ahead = np.flip(np.cumsum(np.flip(blockers, axis=1), axis=1), axis=1) > 0
+        ahead = np.concatenate([ahead[:, 1:], np.zeros_like(ahead[:, :1])], axis=1)
+        passed = rows & ~ahead
+        bonus = (passed.sum(axis=2) * PASSED_PAWN).sum(axis=1)
+        score += sign * (doubled * DOUBLED_PAWN + isolated * ISOLATED_PAWN + bonus)
+    return score
+
+
+def evaluate_batch(codes: np.ndarray, black_to_move: np.ndarray, terms: bool = True) -> np.ndarray:
+    """returns the score of every position from the point of view of its
+    player to move, terms False leaves out mobility, which evaluate does not score"""
+    scores = np.empty(len(codes), dtype=np.int32)
+    for start in range(0, len(codes), CHUNK):
+        chunk = codes[start:start + CHUNK].astype(np.intp)
+        score = material(chunk) + pawn_structure(chunk)
+        if terms:
+            score = score + mobility(chunk)
+        scores[start:start + CHUNK] = score
+    return np.where(black_to_move, -scores, scores)
+
+
+def benchmark(count: int = 20000) -> dict:
+    """returns positions per second for the scalar evaluator and the batch,
+    over the positions of seeded random games, and whether the batch without
+    mobility agrees with the scalar evaluator. Both start from stored positions, so the
+    scalar side pays for loading each one into a Game."""
+    import random
+    from piece_model import Game
+    from evaluation import evaluate
+    rnd = random.Random(0)
+    positions = []
+    game = Game(backend='array')
+    while len(positions) < count:
+        positions.append(game.position())
+        moves = game.legal_moves(game.current_player)
+        if not moves or len(game.prior_state) >= 120:
+            game = Game(backend='array')
+            continue
+        game.make_move(*rnd.choice(moves))
+    start = time.perf_counter()
+    scalar = [evaluate(Game(backend='array', position=position)) for position in positions]
+    scalar_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    codes, black = pack(positions)
+    batch = evaluate_batch(codes, black)
+    batch_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    without_mobility = evaluate_batch(codes, black, terms=False)
+    without_seconds = time.perf_counter() - start
+    return {'positions': count, 'scalar': count / scalar_seconds, 'batch': count / batch_seconds,
+            'batch_without_mobility': count / without_seconds, 'agree': without_mobility.tolist() == scalar,
+            'mean_mobility': float(np.abs(batch - without_mobility).mean())}
+
+
+if __name__ == '__main__':
+    import sys
+    report = benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
+    print(f'{report["positions"]:,} positions, batch without mobility agrees with evaluate: {report["agree"]}')
+    print(f'         scalar evaluate: {report["scalar"]:12,.0f} positions per second')
+    print(f'  batch, without mobility: {report["batch_without_mobility"]:12,.0f} positions per second')
+    print(f'       batch, all terms: {report["batch"]:12,.0f} positions per second')
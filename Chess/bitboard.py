@@ -0,0 +1,259 @@
+"""
+Bitboard move generator, an alternative engine behind Game.valid_moves
+that gives the same moves as the valid_moves of the Piece classes. Its
+fast path is perft, which makes and takes back moves and tests check
+on a scratch copy of the bitboards without going through Game at all.
+
+Square y * 8 + x is bit y * 8 + x of a 64 bit integer.
+"""
+from piece_codes import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, KIND_MASK, BLACK, MOVED
+from attack_tables import (SQUARE_COORDS, SOUTH, ORTHOGONAL, DIAGONAL, ALL_DIRECTIONS, RAYS,
+                           KNIGHT_MASKS, KING_MASKS, PAWN_CAPTURE_MASKS)
+
+#For every square, the non empty rays in each slider direction set as (ray, rays of that direction, upward)
+SLIDER_RAYS = {directions: [[(RAYS[direction][square], RAYS[direction], direction < SOUTH)
+                             for direction in directions if RAYS[direction][square]]
+                            for square in range(64)]
+               for directions in (ORTHOGONAL, DIAGONAL, ALL_DIRECTIONS)}
+
+
+def slider_moves(square: int, directions, occupied: int) -> int:
+    """returns every square a slider reaches from a square, stopping on
+    (and including) the first piece found in each direction"""
+    moves = 0
+    for ray, rays, upward in SLIDER_RAYS[directions][square]:
+        blockers = ray & occupied
+        if blockers:
+            #the closest blocker is the lowest bit going up and the highest going down
+            if upward:
+                ray ^= rays[(blockers & -blockers).bit_length() - 1]
+            else:
+                ray ^= rays[blockers.bit_length() - 1]
+        moves |= ray
+    return moves
+
+
+def squares(bits: int) -> list[tuple[int, int]]:
+    """returns the (y, x) coordinates of every set bit"""
+    coords = []
+    while bits:
+        low = bits & -bits
+        coords.append(SQUARE_COORDS[low.bit_length() - 1])
+        bits ^= low
+    return coords
+
+
+class BitboardEngine:
+    """Keeps a bitboard for every kind and color of piece in step with a Game
+    and generates moves from them"""
+    def __init__(self, game):
+        """Creates the instance variables
+
+        _squares:
+            the piece code array of the game, read for pawn moved flags.
+        _boards:
+            one bitboard per piece code without the moved bit (kind | color).
+        _occupied:
+            the squares held by white and by black.
+        """
+        self._squares = game._squares
+        self._boards = [0] * 16
+        self._occupied = [0, 0]
+        self.reload(game._squares)
+
+    def reload(self, squares: bytearray) -> None:
+        """rebuilds every bitboard from the 64 piece codes"""
+        self._boards = [0] * 16
+        self._occupied = [0, 0]
+        for square, code in enumerate(squares):
+            if code:
+                self.square_changed(square, EMPTY, code)
+
+    def square_changed(self, square: int, old: int, new: int) -> None:
+        """moves the square's bit out of the old piece's bitboards and into the new one's"""
+        bit = 1 << square
+        if old:
+            self._boards[old & 15] ^= bit
+            self._occupied[old >> 3 & 1] ^= bit
+        if new:
+            self._boards[new & 15] ^= bit
+            self._occupied[new >> 3 & 1] ^= bit
+
+    def pieces(self, kind: int, color_value: int) -> int:
+        """returns the bitboard of one kind of piece of one color"""
+        return self._boards[kind | color_value << 3]
+
+    def occupied(self, color_value: int) -> int:
+        """returns the bitboard of every piece of one color"""
+        return self._occupied[color_value]
+
+    def moves_mask(self, square: int) -> int:
+        """returns the bitboard of the moves the piece on a square can make,
+        matching the valid_moves of its Piece class"""
+        code = self._squares[square]
+        kind = code & KIND_MASK
+        color_value = code >> 3 & 1
+        own = self._occupied[color_value]
+        if kind == KNIGHT:
+            #Knight.valid_moves also lists the knight's own square
+            return KNIGHT_MASKS[square] & ~own | 1 << square
+        if kind == KING:
+            return KING_MASKS[square] & ~own
+        if kind == PAWN:
+            return self._pawn_moves(square, code, own)
+        occupied = own | self._occupied[color_value ^ 1]
+        if kind == ROOK:
+            return slider_moves(square, ORTHOGONAL, occupied) & ~own
+        if kind == BISHOP:
+            return slider_moves(square, DIAGONAL, occupied) & ~own
+        if kind == QUEEN:
+            return slider_moves(square, ALL_DIRECTIONS, occupied) & ~own
+        return 0
+
+    def _pawn_moves(self, square: int, code: int, own: int) -> int:
+        """returns the moves of a pawn, which like Pawn.valid_moves can take
+        straight ahead and step onto either empty or enemy diagonal"""
+        color_value = code >> 3 & 1
+        moves = PAWN_CAPTURE_MASKS[color_value][square] & ~own
+        step = -8 if color_value else 8
+        ahead = square + step
+        if 0 <= ahead < 64:
+            bit = 1 << ahead
+            if not own & bit:
+                moves |= bit
+            #two squares ahead only over an empty square and only before moving
+            if not code & MOVED and not (own | self._occupied[color_value ^ 1]) & bit:
+                ahead += step
+                if 0 <= ahead < 64 and not own & 1 << ahead:
+                    moves |= 1 << ahead
+        return moves
+
+    def valid_moves(self, y: int, x: int) -> list[tuple[int, int]]:
+        """returns the moves of the piece on a square as (y, x) coordinates"""
+        if self._squares[y * 8 + x] == EMPTY:
+            return []
+        return squares(self.moves_mask(y * 8 + x))
+
+    def attacked(self, square: int, by: int) -> bool:
+        """returns True if a piece of the color value by could move to the
+        square, as Game._attacked does, from the bitboards"""
+        boards = self._boards
+        bit = by << 3
+        if KNIGHT_MASKS[square] & boards[KNIGHT | bit] or KING_MASKS[square] & boards[KING | bit]:
+            return True
+        occupied = self._occupied[0] | self._occupied[1]
+        pawns = boards[PAWN | bit]
+        if pawns:
+            #pawns take straight ahead and step onto both diagonals, see Pawn.valid_moves
+            if PAWN_CAPTURE_MASKS[by ^ 1][square] & pawns:
+                return True
+            step = 8 if by else -8
+            behind = square + step
+            if 0 <= behind < 64:
+                if pawns >> behind & 1:
+                    return True
+                #an unmoved pawn two squares back reaches the square over an empty one
+                behind += step
+                if (0 <= behind < 64 and pawns >> behind & 1 and not occupied >> (behind - step) & 1
+                        and not self._squares[behind] & MOVED):
+                    return True
+        rooks = boards[ROOK | bit] | boards[QUEEN | bit]
+        if rooks and slider_moves(square, ORTHOGONAL, occupied) & rooks:
+            return True
+        bishops = boards[BISHOP | bit] | boards[QUEEN | bit]
+        return bool(bishops and slider_moves(square, DIAGONAL, occupied) & bishops)
+
+    def perft(self, color_value: int, depth: int) -> int:
+        """returns the number of leaf nodes depth plies below the position
+        with the color value to move, counted on a scratch copy so the game
+        and its listeners are never touched"""
+        scratch = BitboardEngine.__new__(BitboardEngine)
+        scratch._squares = bytearray(self._squares)
+        scratch._boards = list(self._boards)
+        scratch._occupied = list(self._occupied)
+        return scratch._perft(color_value, depth)
+
+    def _perft(self, color_value: int, depth: int) -> int:
+        """perft on a scratch engine, playing each move on the codes and
+        bitboards like Game.move does and keeping it only if it leaves the
+        king safe"""
+        squares, boards, occupied = self._squares, self._boards, self._occupied
+        nodes = 0
+        own = occupied[color_value]
+        king_board = KING | color_value << 3
+        king = boards[king_board]
+        #out of check, only the king and the pieces it sees along a line can
+        #leave it attacked, a slider's pin or the middle square of an enemy
+        #pawn's double step, every other move is legal without trying it
+        if king:
+            king_square = king.bit_length() - 1
+            in_check = self.attacked(king_square, color_value ^ 1)
+            exposed = king | slider_moves(king_square, ALL_DIRECTIONS, occupied[0] | occupied[1])
+        else:
+            in_check, exposed = False, 0
+        while own:
+            low = own & -own
+            own ^= low
+            square = low.bit_length() - 1
+            code = squares[square]
+            pawn = code & KIND_MASK == PAWN
+            moved = code | MOVED if pawn else code
+            #Knight.valid_moves lists the knight's own square, which is not a move
+            targets = self.moves_mask(square) & ~low
+            safe = not in_check and not low & exposed
+            if safe and depth == 1:
+                nodes += targets.bit_count()
+                continue
+            while targets:
+                target_bit = targets & -targets
+                targets ^= target_bit
+                target = target_bit.bit_length() - 1
+                #a pawn reaching either end of the board becomes a Queen
+                new = QUEEN | code & BLACK if pawn and (target < 8 or target >= 56) else moved
+                captured = squares[target]
+                squares[target] = new
+                squares[square] = EMPTY
+                boards[code & 15] ^= low
+                boards[new & 15] ^= target_bit
+                occupied[color_value] ^= low | target_bit
+                if captured:
+                    boards[captured & 15] ^= target_bit
+                    occupied[color_value ^ 1] ^= target_bit
+                king = boards[king_board]
+                if safe or not king or not self.attacked(king.bit_length() - 1, color_value ^ 1):
+                    nodes += 1 if depth == 1 else self._perft(color_value ^ 1, depth - 1)
+                if captured:
+                    boards[captured & 15] ^= target_bit
+                    occupied[color_value ^ 1] ^= target_bit
+                occupied[color_value] ^= low | target_bit
+                boards[new & 15] ^= target_bit
+                boards[code & 15] ^= low
+                squares[square] = code
+                squares[target] = captured
+        return nodes
+
+
+def benchmark(depth: int = 3) -> dict:
+    """returns the perft nodes per second of each perft method, over the
+    start position and kiwipete"""
+    from perft import METHODS, SUITE, load, timed
+    results = {}
+    for method in METHODS:
+        nodes = seconds = 0
+        for name, fen, counts in SUITE[:2]:
+            game = load(fen, method)
+            count, rate = timed(game, depth, method)
+            if count != counts[depth - 1]:
+                raise ValueError(f'perft of {name} with {method} gave {count}, not {counts[depth - 1]}')
+            nodes += count
+            seconds += count / rate
+        results[method] = nodes / seconds
+    return results
+
+
+if __name__ == '__main__':
+    results = benchmark()
+    for method, rate in results.items():
+        print(f'{method:>10}: {rate:12,.0f} perft nodes per second')
+    print(f'bitboard over reference: {results["bitboard"] / results["reference"]:.1f}x, '
+          f'over legal: {results["bitboard"] / results["legal"]:.1f}x')
@@ -1,6 +1,8 @@
 import pygame as pg
 import pygame_gui as gui
 from piece_model import *
+from sprite_atlas import SpriteAtlas
+from engine_worker import EngineWorker
 
 
 class GUI:
@@ -10,6 +12,8 @@ class GUI:
         self._screen = pg.display.set_mode((1440, 900))
         pg.display.set_caption("Laker Chess")
         self._pieces = pg.image.load("./images/pieces.png")
+        self._atlas = SpriteAtlas(self._pieces)
+        Piece.set_atlas(self._atlas)
         self._ui_manager = gui.UIManager((1440, 900))
         self._side_box = gui.elements.UITextBox('<b>Laker Chess</b><br /><br />White moves first.<br />', relative_rect=pg.Rect((1000, 100), (400, 500)),
                                  manager=self._ui_manager)
@@ -21,6 +25,8 @@ class GUI:
         self._first_selected = (0, 0)
         self._second_selected = (0, 0)
         self._valid_moves = []
+        #the computer player thinks on a worker thread while the board is drawn
+        self._engine = EngineWorker()
 
     def run_game(self) -> None:
         running = True
@@ -30,7 +36,8 @@ class GUI:
             for event in pg.event.get():
                 if event.type == pg.QUIT:
                     running = False
-                if event.type == pg.MOUSEBUTTONDOWN:
+                #the board is left alone while the computer player thinks
+                if event.type == pg.MOUSEBUTTONDOWN and not self._engine.busy:
                     x, y = pg.mouse.get_pos()
                     y, x = self.__get_coords__(y, x)
                     piece = self._game.get(y, x)
@@ -39,7 +46,7 @@ class GUI:
                             continue
                         self._piece_selected = True
                         self._first_selected = y, x
-                        self._valid_moves = piece.valid_moves(y, x)
+                        self._valid_moves = self._game.valid_moves(y, x)
                         self._piece_selected = piece
                     elif self._piece_selected and (y, x) in self._valid_moves:
                         target = self._game.get(y, x)
@@ -50,35 +57,41 @@ class GUI:
                             if target:
                                 self._side_box.append_html_text(' and captures ' + str(type(target).__name__))
                             self._side_box.append_html_text('<br />')
-                            computer_message = self._game._computer_move()
-                            if computer_message:
-                                self._side_box.append_html_text(computer_message)
+                            self.__report_status__()
+                            self._engine.submit(self._game)
                         else:
                             self._side_box.append_html_text('Invalid move.  Would leave '
                                                             + str(self._piece_selected.color.name) + ' in check.<br />')
-                        if self._game.check(Color.WHITE):
-                            self._side_box.append_html_text("WHITE is in CHECK!<br />")
-                        if self._game.check(Color.BLACK):
-                            self._side_box.append_html_text("BLACK is in CHECK!<br />")
-                        if self._game.mate(Color.WHITE):
-                            self._side_box.append_html_text("WHITE is in CHECKMATE!<br />GAME OVER!")
-                        if self._game.mate(Color.BLACK):
-                            self._side_box.append_html_text("BLACK is in CHECKMATE!<br />GAME OVER!")
+                            self.__report_status__()
 
                         self._piece_selected = False
                     else:
                         self._piece_selected = False
                 if event.type == gui.UI_BUTTON_PRESSED:
                     if event.ui_element == self._restart_button:
+                        self._engine.cancel()
                         self._game.reset()
                         self._side_box.set_text("Restarting game...<br />")
                     if event.ui_element == self._undo_button:
+                        self._engine.cancel()
+                        self._piece_selected = False
                         if self._game.undo():
+                            #the computer's reply goes back with the move it answered,
+                            #so it is always the human player's turn afterwards
+                            if self._game.current_player != Color.WHITE:
+                                self._game.undo()
                             self._side_box.append_html_text('Undoing move.<br />')
                         else:
                             self._side_box.append_html_text('Nothing to undo.<br />')
             self._ui_manager.process_events(event)
 
+            result = self._engine.poll()
+            if result is not None:
+                computer_message = self._game._play_result(result)
+                if computer_message:
+                    self._side_box.append_html_text(computer_message)
+                self.__report_status__()
+
             self._screen.fill((255, 255, 255))
             self.__draw_board__()
             self._ui_manager.draw_ui(self._screen)
@@ -87,6 +100,20 @@ class GUI:
             pg.display.flip()
             time_delta = clock.tick(30) / 1000.0
 
+    def __report_status__(self) -> None:
+        """adds any check, checkmate or stalemate to the side box"""
+        if self._game.check(Color.WHITE):
+            self._side_box.append_html_text("WHITE is in CHECK!<br />")
+        if self._game.check(Color.BLACK):
+            self._side_box.append_html_text("BLACK is in CHECK!<br />")
+        if self._game.mate(Color.WHITE):
+            self._side_box.append_html_text("WHITE is in CHECKMATE!<br />GAME OVER!")
+        if self._game.mate(Color.BLACK):
+            self._side_box.append_html_text("BLACK is in CHECKMATE!<br />GAME OVER!")
+        if self._game.is_stalemate(self._game.current_player):
+            self._side_box.append_html_text(self._game.current_player.name
+                                            + " is in STALEMATE!<br />GAME OVER!")
+
     def __get_coords__(self, y, x):
         grid_x = x // 105
         grid_y = y // 105
@@ -107,8 +134,9 @@ class GUI:
                     pg.draw.rect(self._screen, (255, 0, 0), pg.rect.Rect(x * 105, y * 105, 105, 105), 2)
                 if self._valid_moves and self._piece_selected and (y, x) in self._valid_moves:
                     pg.draw.rect(self._screen, (0, 0, 255), pg.rect.Rect(x * 105, y * 105, 105, 105), 2)
-                if self._game.get(y, x):
-                    self._screen.blit(self._game.get(y, x)._image, (x * 105, y * 105))
+                piece = self._game.get(y, x)
+                if piece:
+                    self._screen.blit(self._atlas.image(piece.sprite), (x * 105, y * 105))
             count = count + 1
         pg.draw.line(self._screen, (0, 0, 0), (0, 840), (840, 840))
         pg.draw.line(self._screen, (0, 0, 0), (840, 840), (840, 0))
@@ -0,0 +1,94 @@
+"""
+Runs the computer player's search on a background thread so the GUI can
+keep drawing while it thinks
+"""
+import threading
+from piece_model import Game
+from search import Search, SearchLimits
+from transposition import TranspositionTable
+
+
+class EngineWorker:
+    """Searches a copy of a position on a worker thread. The caller submits a
+    game, polls once a frame and plays the result when one is ready."""
+    def __init__(self, depth: int = 3, limits: SearchLimits = None, table_mb: int = 16):
+        """Creates the instance variables
+
+        depth, limits:
+            passed to Search.search for every position submitted.
+        _table:
+            the transposition table, kept between moves.
+        _search:
+            the search in flight, a new one for every position so stopping
+            it can never stop the next.
+        _thread:
+            the thread of the search in flight, or None.
+        _result:
+            the finished SearchResult waiting to be polled, or None.
+        _generation:
+            counts submissions and cancels so a cancelled search can never
+            hand back its result.
+        """
+        self.depth = depth
+        self.limits = limits
+        self._table = TranspositionTable(table_mb)
+        self._search = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._result = None
+        self._generation = 0
+
+    @property
+    def busy(self) -> bool:
+        """returns True while a search is running or its result has not been polled"""
+        with self._lock:
+            return self._thread is not None
+
+    def submit(self, game: Game) -> None:
+        """starts searching the position of game for its player to move,
+        cancelling any search already running"""
+        self.cancel()
+        #the search plays moves on its own copy, never on the game being drawn
+        copy = Game(backend='array', position=game.position())
+        with self._lock:
+            generation = self._generation
+            self._search = Search(self._table)
+            self._thread = threading.Thread(target=self._run, args=(self._search, copy, generation), daemon=True)
+            self._thread.start()
+
+    def _run(self, search: Search, game: Game, generation: int) -> None:
+        """searches game on the worker thread and keeps the result if it is still wanted"""
+        result = None
+        try:
+            result = search.search(game, self.depth, self.limits)
+        finally:
+            with self._lock:
+                if generation == self._generation:
+                    if result is not None:
+                        self._result = result
+                    else:
+                        #the search failed, so the board must not wait for it
+                        self._thread = None
+
+    def poll(self):
+        """returns the finished SearchResult once, or None while the search is running"""
+        with self._lock:
+            result = self._result
+            if result is None:
+                return None
+            self._result = None
+            self._thread = None
+            return result
+
+    def cancel(self) -> None:
+        """stops the search in flight and forgets its result"""
+        with self._lock:
+            self._generation += 1
+            thread, search = self._thread, self._search
+            self._thread = None
+            self._result = None
+        #the search clears its stop flag as it starts, so the stop is repeated
+        #until the thread ends in case it landed before that
+        while thread is not None and thread.is_alive():
+            search.stop()
+            thread.join(0.05)
@@ -0,0 +1,177 @@
+"""
+Static evaluation of a Game position for the computer player: material
+plus piece-square tables tapered from the middlegame to the endgame, and
+pawn structure from the pawn hash table.
+
+Game keeps running middlegame and endgame totals and a game phase,
+updated in Game.set from the tables here, so evaluate costs the same
+whatever is on the board. evaluate_from_scratch works the same score
+out from all 64 squares to check them against.
+"""
+from piece_codes import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, KIND_MASK, BLACK
+from pawn_hash import PawnHashTable, pawn_structure
+
+#The value of each kind of piece in centipawns, indexed by kind
+PIECE_VALUES = [0] * 8
+PIECE_VALUES[PAWN] = 100
+PIECE_VALUES[KNIGHT] = 320
+PIECE_VALUES[BISHOP] = 330
+PIECE_VALUES[ROOK] = 500
+PIECE_VALUES[QUEEN] = 900
+PIECE_VALUES[KING] = 0
+
+#How much each kind of piece counts towards the middlegame, with all of
+#them on the board the phase is PHASE_TOTAL and it falls to 0 as they go
+PHASE_WEIGHTS = [0] * 8
+PHASE_WEIGHTS[KNIGHT] = 1
+PHASE_WEIGHTS[BISHOP] = 1
+PHASE_WEIGHTS[ROOK] = 2
+PHASE_WEIGHTS[QUEEN] = 4
+PHASE_TOTAL = 24
+
+#The pawn structure results shared by every evaluation in this process
+PAWN_TABLE = PawnHashTable()
+
+#Piece-square bonuses for white, laid out as the board is drawn with white
+#at the bottom, so the first row is y = 7 and the last row is y = 0.
+#Black uses the same tables mirrored.
+_PAWN_MG = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+     5,   5,  10,  25,  25,  10,   5,   5,
+     0,   0,   0,  20,  20,   0,   0,   0,
+     5,  -5, -10,   0,   0, -10,  -5,   5,
+     5,  10,  10, -20, -20,  10,  10,   5,
+     0,   0,   0,   0,   0,   0,   0,   0]
+_PAWN_EG = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+    80,  80,  80,  80,  80,  80,  80,  80,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    30,  30,  30,  30,  30,  30,  30,  30,
+    20,  20,  20,  20,  20,  20,  20,  20,
+    10,  10,  10,  10,  10,  10,  10,  10,
+     0,   0,   0,   0,   0,   0,   0,   0,
+     0,   0,   0,   0,   0,   0,   0,   0]
+_KNIGHT = [
+   -50, -40, -30, -30, -30, -30, -40, -50,
+   -40, -20,   0,   0,   0,   0, -20, -40,
+   -30,   0,  10,  15,  15,  10,   0, -30,
+   -30,   5,  15,  20,  20,  15,   5, -30,
+   -30,   0,  15,  20,  20,  15,   0, -30,
+   -30,   5,  10,  15,  15,  10,   5, -30,
+   -40, -20,   0,   5,   5,   0, -20, -40,
+   -50, -40, -30, -30, -30, -30, -40, -50]
+_BISHOP = [
+   -20, -10, -10, -10, -10, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,  10,  10,   5,   0, -10,
+   -10,   5,   5,  10,  10,   5,   5, -10,
+   -10,   0,  10,  10,  10,  10,   0, -10,
+   -10,  10,  10,  10,  10,  10,  10, -10,
+   -10,   5,   0,   0,   0,   0,   5, -10,
+   -20, -10, -10, -10, -10, -10, -10, -20]
+_ROOK = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+     5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+     0,   0,   0,   5,   5,   0,   0,   0]
+_QUEEN = [
+   -20, -10, -10,  -5,  -5, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,   5,   5,   5,   0, -10,
+    -5,   0,   5,   5,   5,   5,   0,  -5,
+     0,   0,   5,   5,   5,   5,   0,  -5,
+   -10,   5,   5,   5,   5,   5,   0, -10,
+   -10,   0,   5,   0,   0,   0,   0, -10,
+   -20, -10, -10,  -5,  -5, -10, -10, -20]
+_KING_MG = [
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -20, -30, -30, -40, -40, -30, -30, -20,
+   -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,   0,   0,   0,   0,  20,  20,
+    20,  30,  10,   0,   0,  10,  30,  20]
+_KING_EG = [
+   -50, -40, -30, -20, -20, -30, -40, -50,
+   -30, -20, -10,   0,   0, -10, -20, -30,
+   -30, -10,  20,  30,  30,  20, -10, -30,
+   -30, -10,  30,  40,  40,  30, -10, -30,
+   -30, -10,  30,  40,  40,  30, -10, -30,
+   -30, -10,  20,  30,  30,  20, -10, -30,
+   -30, -30,   0,   0,   0,   0, -30, -30,
+   -50, -30, -30, -30, -30, -30, -30, -50]
+
+#The tables by kind, middlegame and endgame
+MG_TABLES = {PAWN: _PAWN_MG, KNIGHT: _KNIGHT, BISHOP: _BISHOP, ROOK: _ROOK, QUEEN: _QUEEN, KING: _KING_MG}
+#(copies where the two phases start out alike, so they can be tuned apart)
+EG_TABLES = {PAWN: _PAWN_EG, KNIGHT: list(_KNIGHT), BISHOP: list(_BISHOP), ROOK: list(_ROOK),
+             QUEEN: list(_QUEEN), KING: _KING_EG}
+
+
+def _square_scores(tables: dict) -> list:
+    """returns the material plus table score of every piece code (see
+    piece_codes) on every square, positive for white and negative for black"""
+    scores = [[0] * 64 for _ in range(32)]
+    for code in range(32):
+        kind = code & KIND_MASK
+        if kind not in tables:
+            continue
+        for square in range(64):
+            y, x = divmod(square, 8)
+            if code & BLACK:
+                scores[code][square] = -(PIECE_VALUES[kind] + tables[kind][y * 8 + x])
+            else:
+                scores[code][square] = PIECE_VALUES[kind] + tables[kind][(7 - y) * 8 + x]
+    return scores
+
+
+#The score of each piece code on each square, as Game.set adds them up
+MG_SCORES = _square_scores(MG_TABLES)
+EG_SCORES = _square_scores(EG_TABLES)
+#The phase weight of each piece code
+PHASES = [PHASE_WEIGHTS[code & KIND_MASK] for code in range(32)]
+
+
+def rebuild_scores() -> None:
+    """recomputes MG_SCORES and EG_SCORES in place after PIECE_VALUES or the
+    tables have been changed, such as by the tuner"""
+    for scores, tables in ((MG_SCORES, MG_TABLES), (EG_SCORES, EG_TABLES)):
+        for code, row in enumerate(_square_scores(tables)):
+            scores[code][:] = row
+
+
+def totals(squares) -> tuple[int, int, int]:
+    """returns the middlegame total, endgame total and phase of 64 piece codes"""
+    middlegame = endgame = phase = 0
+    for square, code in enumerate(squares):
+        if code:
+            middlegame += MG_SCORES[code][square]
+            endgame += EG_SCORES[code][square]
+            phase += PHASES[code]
+    return middlegame, endgame, phase
+
+
+def _taper(middlegame: int, endgame: int, phase: int) -> int:
+    """returns the blend of the two totals for the phase"""
+    phase = min(phase, PHASE_TOTAL)
+    return (middlegame * phase + endgame * (PHASE_TOTAL - phase)) // PHASE_TOTAL
+
+
+def evaluate(game) -> int:
+    """returns the score in centipawns from the point of view of the player
+    to move, from the totals Game keeps up to date and the pawn hash table"""
+    score = _taper(game._middlegame, game._endgame, game._phase) + PAWN_TABLE.probe(game)[0]
+    return -score if game.current_player.value == 1 else score
+
+
+def evaluate_from_scratch(game) -> int:
+    """returns the same score as evaluate worked out from every square"""
+    score = _taper(*totals(game._squares)) + pawn_structure(game._squares)[0]
+    return -score if game.current_player.value == 1 else score
@@ -0,0 +1,63 @@
+"""
+Reads and writes positions in Forsyth-Edwards Notation. Rank 1 is y = 0,
+where white starts, and file a is x = 0. This game has no castling or
+en passant, so those fields are written as '-' and ignored when read.
+"""
+from piece_codes import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, KIND_MASK, BLACK, MOVED
+
+#The piece kinds by their FEN letter, white letters are upper case
+_KINDS = {'p': PAWN, 'n': KNIGHT, 'b': BISHOP, 'r': ROOK, 'q': QUEEN, 'k': KING}
+_LETTERS = {kind: letter for letter, kind in _KINDS.items()}
+#The FEN of the default setup
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1'
+
+
+def position_from_fen(fen: str) -> bytes:
+    """returns the 65 byte Game.position() of a FEN, a pawn off its
+    starting rank counts as having moved"""
+    fields = fen.split()
+    ranks = fields[0].split('/') if fields else []
+    if len(ranks) != 8 or len(fields) > 1 and fields[1] not in ('w', 'b'):
+        raise ValueError('You must provide a valid FEN.')
+    squares = bytearray(64)
+    for rank, row in enumerate(ranks):
+        y = 7 - rank
+        x = 0
+        for letter in row:
+            if letter.isdigit():
+                x += int(letter)
+                continue
+            if letter.lower() not in _KINDS or x > 7:
+                raise ValueError('You must provide a valid FEN.')
+            code = _KINDS[letter.lower()]
+            if letter.islower():
+                code |= BLACK
+            if code & KIND_MASK == PAWN and y != (6 if code & BLACK else 1):
+                code |= MOVED
+            squares[y * 8 + x] = code
+            x += 1
+        if x != 8:
+            raise ValueError('You must provide a valid FEN.')
+    black = len(fields) > 1 and fields[1] == 'b'
+    return bytes(squares) + bytes((int(black),))
+
+
+def fen_from_position(position: bytes, moves_played: int = 0) -> str:
+    """returns the FEN of a 65 byte Game.position()"""
+    ranks = []
+    for y in range(7, -1, -1):
+        row = ''
+        empty = 0
+        for x in range(8):
+            code = position[y * 8 + x]
+            if code == EMPTY:
+                empty += 1
+                continue
+            if empty:
+                row += str(empty)
+                empty = 0
+            letter = _LETTERS[code & KIND_MASK]
+            row += letter if code & BLACK else letter.upper()
+        ranks.append(row + (str(empty) if empty else ''))
+    side = 'b' if position[64] else 'w'
+    return f'{"/".join(ranks)} {side} - - 0 {moves_played // 2 + 1}'
@@ -0,0 +1,158 @@
+"""
+Differential fuzzing of the move generators: plays seeded random games and,
+position by position, compares the Piece classes with the bitboard engine,
+check with _check_by_moves, legal_moves with trying every move through
+Game.move, and is_checkmate with the same worked out by hand.
+
+    python fuzz.py [--games N] [--seconds S] [--seed N] [--out FILE]
+"""
+import random
+import time
+from piece_model import Game, Color
+from piece_codes import EMPTY, KIND_MASK, KING
+from fen import fen_from_position
+from perft import reference_moves
+
+#Where shrunk mismatching positions are written, one FEN and its mismatches per line
+FAILURES = 'fuzz_failures.txt'
+
+
+class Fuzzer:
+    """Compares the engines on positions and keeps how long each one took"""
+    def __init__(self):
+        """Creates the instance variables
+
+        seconds:
+            the time spent in each engine, by name.
+        positions, mismatches:
+            how many positions were compared and how many disagreed.
+        """
+        self.seconds = {'reference': 0.0, 'bitboard': 0.0, 'check': 0.0,
+                        'check_by_moves': 0.0, 'legal_moves': 0.0, 'move_filter': 0.0}
+        self.positions = 0
+        self.mismatches = 0
+
+    def _timed(self, engine: str, work):
+        """returns the result of work, adding the time it took to engine"""
+        start = time.perf_counter()
+        result = work()
+        self.seconds[engine] += time.perf_counter() - start
+        return result
+
+    def compare(self, position: bytes) -> list[str]:
+        """returns a description of every way the engines disagree on a position"""
+        self.positions += 1
+        reference = Game(position=position)
+        bitboard = Game(position=position, engine='bitboard')
+        problems = []
+        squares = [(y, x) for y in range(8) for x in range(8) if position[y * 8 + x] != EMPTY]
+        expected = self._timed('reference', lambda: {square: sorted(reference.valid_moves(*square))
+                                                     for square in squares})
+        found = self._timed('bitboard', lambda: {square: sorted(bitboard.valid_moves(*square))
+                                                 for square in squares})
+        for square in squares:
+            if expected[square] != found[square]:
+                problems.append(f'valid_moves{square}: reference {expected[square]} bitboard {found[square]}')
+        for color in Color:
+            fast = self._timed('check', lambda: reference.check(color))
+            slow = self._timed('check_by_moves', lambda: reference._check_by_moves(color))
+            if fast != slow:
+                problems.append(f'check({color.name}): check {fast} _check_by_moves {slow}')
+        color = reference.current_player
+        legal = self._timed('legal_moves', lambda: sorted(reference.legal_moves(color)))
+        tried = self._timed('move_filter', lambda: sorted(self._filter(reference)))
+        if legal != tried:
+            problems.append(f'legal_moves: legal_moves {len(legal)} moves, Game.move {len(tried)} moves, '
+                            f'differing {sorted(set(legal) ^ set(tried))}')
+        mate = reference.is_checkmate(color)
+        if mate != (not tried and reference._check_by_moves(color)):
+            problems.append(f'is_checkmate({color.name}): {mate}')
+        if problems:
+            self.mismatches += 1
+        return problems
+
+    @staticmethod
+    def _filter(game: Game) -> list:
+        """returns the moves of the player to move that Game.move accepts"""
+        moves = []
+        for y, x, y2, x2 in reference_moves(game):
+            if game.move(game.get(y, x), y, x, y2, x2):
+                moves.append((y, x, y2, x2))
+                game.undo()
+        return moves
+
+    def shrink(self, position: bytes) -> tuple[bytes, list[str]]:
+        """returns the position with every piece but the kings removed that
+        can be while the engines still disagree, and how they disagree there"""
+        #the trial positions are not part of the counts or timings
+        counts = self.positions, self.mismatches, dict(self.seconds)
+        shrunk = bytearray(position)
+        problems = self.compare(position)
+        removed = True
+        while removed:
+            removed = False
+            for square in range(64):
+                if shrunk[square] == EMPTY or shrunk[square] & KIND_MASK == KING:
+                    continue
+                trial = bytearray(shrunk)
+                trial[square] = EMPTY
+                found = self.compare(bytes(trial))
+                if found:
+                    shrunk, problems = trial, found
+                    removed = True
+        self.positions, self.mismatches, self.seconds = counts
+        return bytes(shrunk), problems
+
+    def rates(self) -> dict:
+        """returns the positions per second each engine managed"""
+        return {engine: self.positions / seconds if seconds > 0 else 0.0
+                for engine, seconds in self.seconds.items()}
+
+
+def random_game(rnd: random.Random, max_plies: int = 200):
+    """yields the positions of a random game of legal moves, ending at mate,
+    stalemate or max_plies"""
+    game = Game(backend='array')
+    for _ in range(max_plies):
+        yield game.position()
+        moves = game.legal_moves(game.current_player)
+        if not moves:
+            return
+        game.make_move(*rnd.choice(moves))
+    yield game.position()
+
+
+def run(games: int = 100, seconds: float = None, seed: int = 0, out: str = FAILURES) -> Fuzzer:
+    """fuzzes up to games random games or for seconds, writing the shrunk
+    FEN of every mismatch to out, and returns the Fuzzer with its counts"""
+    rnd = random.Random(seed)
+    fuzzer = Fuzzer()
+    #one line per distinct shrunk position, many games tend to find the same one
+    saved = set()
+    start = time.perf_counter()
+    for _ in range(games):
+        for position in random_game(rnd):
+            if fuzzer.compare(position):
+                shrunk, problems = fuzzer.shrink(position)
+                if shrunk in saved:
+                    continue
+                saved.add(shrunk)
+                with open(out, 'a') as failures:
+                    failures.write(fen_from_position(shrunk) + ' ; ' + ' | '.join(problems) + '\n')
+        if seconds is not None and time.perf_counter() - start >= seconds:
+            break
+    return fuzzer
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare the move generators on random games.')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=None, help='stop after this long')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=FAILURES)
+    args = parser.parse_args()
+    fuzzer = run(args.games, args.seconds, args.seed, args.out)
+    print(f'{fuzzer.positions:,} positions, {fuzzer.mismatches} mismatches')
+    for engine, rate in fuzzer.rates().items():
+        print(f'{engine:>15}: {rate:12,.0f} positions per second')
@@ -0,0 +1,105 @@
+"""
+Move ordering for the search, trying the moves most likely to cause a
+cutoff first: the hash move, captures by MVV-LVA, killer moves and then
+quiet moves by their history score
+"""
+from piece_codes import PAWN, KIND_MASK, EMPTY
+from evaluation import PIECE_VALUES
+
+#How many plies of killer moves are kept
+MAX_PLY = 128
+#Sort keys for each class of move, a higher key is tried earlier
+_FIRST = 1 << 40
+_CAPTURE = 1 << 32
+_PROMOTION = 1 << 31
+_KILLER = 1 << 30
+
+
+class MoveOrderer:
+    """Scores and sorts the legal moves of a position and learns from the
+    moves that caused beta cutoffs"""
+    def __init__(self):
+        """Creates the instance variables
+
+        killers:
+            two quiet moves per ply that caused a cutoff there, newest first.
+        history:
+            a score per color, from square and to square that grows each time
+            a quiet move causes a cutoff, more for deeper cutoffs.
+        cutoffs, first_move_cutoffs:
+            how many nodes were cut off, and how many of those by the first move tried.
+        """
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[[0] * 64 for _ in range(64)] for _ in range(2)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self) -> None:
+        """forgets the killers of the last search and halves the history scores"""
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for color in self.history:
+            for row in color:
+                for square in range(64):
+                    row[square] >>= 1
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    @staticmethod
+    def mvv_lva(squares, move) -> int:
+        """returns the most valuable victim, least valuable attacker score of a capture"""
+        y, x, y2, x2 = move
+        victim = squares[y2 * 8 + x2] & KIND_MASK
+        attacker = squares[y * 8 + x] & KIND_MASK
+        return PIECE_VALUES[victim] * 16 - PIECE_VALUES[attacker] // 16
+
+    def order(self, game, moves: list, ply: int, first=()) -> list:
+        """sorts moves in place so the most promising come first and returns them
+
+        first:
+            moves to try before anything else in this order, such as the
+            hash move and the move of the last principal variation.
+        """
+        squares = game._squares
+        killers = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history[game.current_player.value]
+        priority = {move: _FIRST * (len(first) - index) for index, move in enumerate(first) if move is not None}
+
+        def key(move):
+            if move in priority:
+                return priority[move]
+            y, x, y2, x2 = move
+            score = 0
+            if squares[y2 * 8 + x2] != EMPTY:
+                score = _CAPTURE + self.mvv_lva(squares, move)
+            elif move == killers[0]:
+                score = _KILLER + 1
+            elif move == killers[1]:
+                score = _KILLER
+            else:
+                score = history[y * 8 + x][y2 * 8 + x2]
+            #a pawn reaching either end becomes a Queen
+            if squares[y * 8 + x] & KIND_MASK == PAWN and (y2 == 0 or y2 == 7):
+                score += _PROMOTION
+            return score
+
+        moves.sort(key=key, reverse=True)
+        return moves
+
+    def record_cutoff(self, game, move, ply: int, depth: int, index: int) -> None:
+        """learns from a move that caused a beta cutoff, index is its place in the move order"""
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        y, x, y2, x2 = move
+        #only quiet moves become killers and earn history
+        if game._squares[y2 * 8 + x2] != EMPTY:
+            return
+        if ply < MAX_PLY and self.killers[ply][0] != move:
+            self.killers[ply][1] = self.killers[ply][0]
+            self.killers[ply][0] = move
+        self.history[game.current_player.value][y * 8 + x][y2 * 8 + x2] += depth * depth
+
+    def stats(self) -> dict:
+        """returns the cutoff counts and the share of cutoffs made by the first move"""
+        return {'cutoffs': self.cutoffs, 'first_move_cutoffs': self.first_move_cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0}
@@ -0,0 +1,187 @@
+"""
+A small NNUE style neural evaluator. The first layer has one input per
+kind and color of piece on each square. Its output, the accumulator, is
+kept up to date as a Game listener by adding and taking away one weight
+row per square that changes, so a search pays only for the small dense
+head at each node.
+
+The accumulator weights are quantised to integers of SCALE per unit when
+they are loaded, so the accumulator is exact however many moves and undos
+it has followed, and always equals one built from scratch.
+
+The weights are read from a local .npz file with these arrays:
+
+    w1 (768, H), b1 (H,)    the accumulator
+    w2 (H, M),  b2 (M,)     the hidden layer
+    w3 (M,),    b3 ()       the output, a score in centipawns for white
+
+    python nnue.py weights.npz [--create]
+"""
+import time
+import numpy as np
+from piece_codes import KIND_MASK, BLACK
+
+#The inputs of the first layer, one per kind and color of piece on each square
+FEATURES = 768
+#Activations are clipped to this, as in NNUE
+CLIP = 1.0
+#The accumulator weights are stored as integer multiples of 1 / SCALE
+SCALE = 1 << 14
+
+
+def feature(code: int, square: int) -> int:
+    """returns the first layer input of a piece code (see piece_codes) on a square"""
+    return ((code & BLACK) // BLACK * 6 + (code & KIND_MASK) - 1) * 64 + square
+
+
+class Accumulator:
+    """The first layer output of one Game, kept in step with it as a listener"""
+    def __init__(self, network: 'Network', game):
+        """Creates the instance variables
+
+        network:
+            the weights the accumulator is built from.
+        values:
+            b1 plus the w1 row of every piece on the board, in integer
+            units of 1 / SCALE.
+        """
+        self.network = network
+        self.values = None
+        self.reload(game._squares)
+
+    def reload(self, squares: bytearray) -> None:
+        """rebuilds the accumulator from the 64 piece codes"""
+        rows = [feature(code, square) for square, code in enumerate(squares) if code]
+        self.values = self.network.b1 + self.network.w1[rows].sum(axis=0)
+
+    def square_changed(self, square: int, old: int, new: int) -> None:
+        """takes the old piece's row out of the accumulator and adds the new one's"""
+        if old:
+            self.values -= self.network.w1[feature(old, square)]
+        if new:
+            self.values += self.network.w1[feature(new, square)]
+
+
+class Network:
+    """The weights of the evaluator. Called with a Game, it returns the score
+    from the point of view of the player to move, so it can be passed to
+    Search as its evaluator."""
+    def __init__(self, path: str):
+        """Creates the instance variables
+
+        w1, b1, w2, b2, w3, b3:
+            the layers read from the .npz file at path, w1 and b1 quantised
+            to int32 units of 1 / SCALE and the rest as float32.
+        """
+        with np.load(path) as weights:
+            try:
+                self.w1, self.b1, self.w2, self.b2, self.w3, self.b3 = (
+                    weights[name].astype(np.float32) for name in ('w1', 'b1', 'w2', 'b2', 'w3', 'b3'))
+            except KeyError:
+                raise ValueError('You must provide a valid weights file.')
+        if self.w1.shape[0] != FEATURES or self.w2.shape[0] != self.w1.shape[1]:
+            raise ValueError('You must provide a valid weights file.')
+        #integers add up and take away exactly, floats would drift over a search
+        self.w1 = np.rint(self.w1 * SCALE).astype(np.int32)
+        self.b1 = np.rint(self.b1 * SCALE).astype(np.int64)
+
+    def attach(self, game) -> Accumulator:
+        """returns the game's accumulator for these weights, adding one as a
+        listener the first time"""
+        for listener in game._listeners:
+            if isinstance(listener, Accumulator) and listener.network is self:
+                return listener
+        accumulator = Accumulator(self, game)
+        game._listeners.append(accumulator)
+        return accumulator
+
+    def detach(self, game) -> None:
+        """stops keeping an accumulator for the game"""
+        game._listeners[:] = [listener for listener in game._listeners
+                              if not (isinstance(listener, Accumulator) and listener.network is self)]
+
+    def forward(self, values: np.ndarray) -> float:
+        """returns the score for white of an accumulator"""
+        hidden = np.clip(values, 0, CLIP * SCALE).astype(np.float32) / SCALE @ self.w2 + self.b2
+        return float(np.clip(hidden, 0.0, CLIP) @ self.w3 + self.b3)
+
+    def __call__(self, game) -> int:
+        """returns the score in centipawns from the point of view of the player to move"""
+        score = round(self.forward(self.attach(game).values))
+        return -score if game.current_player.value == 1 else score
+
+    def evaluate_from_scratch(self, game) -> int:
+        """returns the same score as calling the network, without an accumulator"""
+        rows = [feature(code, square) for square, code in enumerate(game._squares) if code]
+        score = round(self.forward(self.b1 + self.w1[rows].sum(axis=0)))
+        return -score if game.current_player.value == 1 else score
+
+
+def create(path: str, hidden: int = 128, middle: int = 32, seed: int = 0) -> None:
+    """writes a weights file to path with the piece values in the first layer
+    and small random weights elsewhere, a starting point for training"""
+    from evaluation import PIECE_VALUES
+    rnd = np.random.default_rng(seed)
+    w1 = rnd.normal(0.0, 0.01, (FEATURES, hidden)).astype(np.float32)
+    b1 = np.full(hidden, 0.5, dtype=np.float32)
+    #the first two units count white and black material, scaled to stay under CLIP
+    for code in range(1, 16):
+        if code & KIND_MASK in (0, 7):
+            continue
+        for square in range(64):
+            w1[feature(code, square), :2] = 0.0
+            w1[feature(code, square), code // BLACK] = PIECE_VALUES[code & KIND_MASK] / 10000
+    w2 = rnd.normal(0.0, 0.01, (hidden, middle)).astype(np.float32)
+    w2[:2] = 0.0
+    w2[:, :2] = 0.0
+    w2[0, 0], w2[1, 1] = 1.0, 1.0
+    b2 = np.zeros(middle, dtype=np.float32)
+    w3 = np.zeros(middle, dtype=np.float32)
+    w3[0], w3[1] = 10000.0, -10000.0
+    np.savez(path, w1=w1, b1=b1, w2=w2, b2=b2, w3=w3, b3=np.float32(0.0))
+
+
+def benchmark(network: Network, seconds: float = 2.0) -> dict:
+    """returns evaluations per second with the accumulator kept by moves and
+    undos and with a full forward pass each time, over a seeded random game"""
+    import random
+    from piece_model import Game
+    rnd = random.Random(0)
+    game = Game(backend='array')
+    network.attach(game)
+    moves = []
+    for _ in range(60):
+        legal = game.legal_moves(game.current_player)
+        if not legal:
+            break
+        moves.append(rnd.choice(legal))
+        game.make_move(*moves[-1])
+    while game.prior_state:
+        game.undo()
+    results = {}
+    for name, evaluate in (('incremental', network), ('from_scratch', network.evaluate_from_scratch)):
+        if name == 'from_scratch':
+            #nothing is kept up to date behind the full forward pass
+            network.detach(game)
+        evaluations = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            #a move and its undo for every evaluation, as in a search
+            for move in moves:
+                game.make_move(*move)
+                evaluate(game)
+            while game.prior_state:
+                game.undo()
+            evaluations += len(moves)
+        results[name] = evaluations / (time.perf_counter() - start)
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2:
+        raise SystemExit('usage: python nnue.py weights.npz [--create]')
+    if '--create' in sys.argv:
+        create(sys.argv[1])
+    for name, rate in benchmark(Network(sys.argv[1])).items():
+        print(f'{name:>12}: {rate:12,.0f} evaluations per second')
@@ -0,0 +1,336 @@
+"""
+Parallel search for the computer player: the moves of the root position
+are split between worker processes, each searching its moves on its own
+copy of the position, and the results are merged in a fixed order
+"""
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from piece_model import Game
+from search import Search, SearchResult, SearchLimits, MATE, MAX_PLY, INFINITY
+from transposition import TranspositionTable, SharedTranspositionTable
+
+#The search of each worker process, made once by _start_worker
+_worker_search = None
+
+
+def _start_worker(table_mb: int, shared_name: str = None) -> None:
+    """gives a worker process its own search and transposition table, or
+    attaches it to the shared table named shared_name"""
+    global _worker_search
+    if shared_name is None:
+        _worker_search = Search(TranspositionTable(table_mb))
+    else:
+        _worker_search = Search(SharedTranspositionTable(table_mb, name=shared_name))
+
+
+def _search_root_move(position: bytes, move, depth: int, alpha: int, beta: int,
+                      nodes: int, deadline: float, fresh: bool) -> tuple:
+    """plays move on position and searches the reply depth - 1 plies deep in a
+    worker process inside the window alpha, beta of the root player, returns
+    (move, score for the root player, pv, nodes, qnodes, table probes, table
+    hits, whether the search finished)
+
+    nodes, deadline:
+        the node budget left for this move and the time.time() the whole
+        search has to end by, either None for no limit.
+    fresh:
+        forgets what earlier tasks left in the table and move ordering, so the
+        result does not depend on which worker ran which task before. A shared
+        table is never cleared by a worker.
+    """
+    global _worker_search
+    if fresh:
+        _worker_search.table.clear()
+        _worker_search = Search(_worker_search.table)
+    table = _worker_search.table
+    probes, hits = table.probes, table.hits
+    seconds = deadline - time.time() if deadline is not None else None
+    if seconds is not None and seconds <= 0:
+        #the time ran out while the task waited its turn
+        return move, 0, [move], 0, 0, 0, 0, False
+    game = Game(backend='array', position=position)
+    game.make_move(*move)
+    if depth > 1:
+        result = _worker_search.search(game, depth - 1, SearchLimits(depth - 1, nodes, seconds), -beta, -alpha)
+        #a search that found a forced mate stops deepening, but it is finished
+        finished = result.depth == depth - 1 or result.depth > 0 and abs(result.score) >= MATE - MAX_PLY
+        score, line = result.score, result.pv
+        move_nodes, qnodes = result.nodes, result.qnodes
+    else:
+        _worker_search.nodes = _worker_search.qnodes = 0
+        _worker_search.limits = SearchLimits()
+        _worker_search._deadline = None
+        score = _worker_search._quiescence(game, -beta, -alpha, 1)
+        line, finished = [], True
+        move_nodes, qnodes = _worker_search.nodes, _worker_search.qnodes
+    score = -score
+    #a mate found from the reply is one ply further from the root
+    if score >= MATE - MAX_PLY:
+        score -= 1
+    elif score <= MAX_PLY - MATE:
+        score += 1
+    return move, score, [move] + line, move_nodes, qnodes, table.probes - probes, table.hits - hits, finished
+
+
+class ParallelSearch:
+    """Searches the root moves of a position across a pool of worker
+    processes, a drop in for Search as Game.SEARCH.
+
+    The root deepens one ply at a time. In each iteration the best move so
+    far is searched first with the full window, then every other move at
+    once with a null window around its score, and only the moves that beat
+    it are searched again. Results are merged in root move order, never in
+    the order they finish.
+    """
+    def __init__(self, workers: int = None, seed: int = None, table_mb: int = 16, shared: bool = False):
+        """Creates the instance variables
+
+        workers:
+            how many processes search at once, every core when None.
+        seed:
+            makes the result reproducible: every root move is searched from an
+            empty table and the moves are shuffled with random.Random(seed),
+            ties between equal scores going to the earliest. None keeps the
+            order of legal_moves and lets workers keep their tables.
+        table_mb:
+            the size of the transposition table of each worker.
+        shared:
+            when True every worker uses one SharedTranspositionTable of
+            table_mb instead of its own, so the result can depend on timing.
+        limits, nodes, qnodes:
+            the limits of the current search and the nodes the workers have
+            visited in it, quiescence included, and in quiescence.
+        probes, hits:
+            how often the workers looked in their tables during the last
+            search and how often they found the position.
+        _position, _deadline:
+            the root of the current search and the time.time() it has to
+            end by, or None.
+        """
+        if workers is not None and workers < 1:
+            raise ValueError('You must provide a valid number of workers.')
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.table_mb = table_mb
+        self.limits = SearchLimits()
+        self.nodes = 0
+        self.qnodes = 0
+        self.probes = 0
+        self.hits = 0
+        self._position = None
+        self._deadline = None
+        self._table = SharedTranspositionTable(table_mb) if shared else None
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """returns the worker pool, starting it the first time"""
+        if self._pool is None:
+            name = self._table.name if self._table is not None else None
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_start_worker,
+                                             initargs=(self.table_mb, name))
+        return self._pool
+
+    def close(self) -> None:
+        """shuts the worker processes down and frees a shared table"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def search(self, game, max_depth: int = 3, limits: SearchLimits = None) -> SearchResult:
+        """searches the root moves in parallel one ply deeper at a time until
+        max_depth or a limit is reached and returns the result of the deepest
+        completed iteration
+
+        limits:
+            as for Search.search, for the whole search: the time budget is
+            one deadline every worker stops at, and the node budget left is
+            shared out between the moves of each batch.
+        """
+        self.limits = limits or SearchLimits()
+        if self.limits.depth is not None:
+            max_depth = self.limits.depth
+        elif self.limits.nodes is not None or self.limits.seconds is not None:
+            max_depth = MAX_PLY - 1
+        start = time.perf_counter()
+        self._deadline = time.time() + self.limits.seconds if self.limits.seconds is not None else None
+        moves = game.legal_moves(game.current_player)
+        if not moves:
+            #checkmate or stalemate, nothing to hand out
+            return Search().search(game, 1)
+        if self.seed is not None:
+            random.Random(self.seed).shuffle(moves)
+        self._position = game.position()
+        self.nodes = self.qnodes = self.probes = self.hits = 0
+        #any legal move beats none if the first iteration cannot finish
+        result = SearchResult(moves[0], 0, 0, 0, 0.0, [moves[0]])
+        for depth in range(1, max_depth + 1):
+            if self.limits.nodes is not None and self.nodes >= self.limits.nodes:
+                break
+            best = self._iteration(moves, depth)
+            if best is None:
+                break
+            move, score, pv = best
+            result = SearchResult(move, score, depth, 0, 0.0, pv)
+            #the best move goes first in the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= MATE - MAX_PLY:
+                break
+        result.nodes, result.qnodes = self.nodes, self.qnodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _iteration(self, moves: list, depth: int):
+        """returns the best (move, score, pv) of the root moves depth plies
+        deep, or None if a limit stopped the iteration"""
+        first = self._run(moves[:1], depth, -INFINITY, INFINITY)
+        if first is None:
+            return None
+        move, score, pv = first[0][:3]
+        rest = self._run(moves[1:], depth, score, score + 1)
+        if rest is None:
+            return None
+        #only the moves that beat the null window are searched again, in root
+        #order, each against the best score found so far
+        window = score
+        for other, bound, *_ in rest:
+            if bound > window:
+                again = self._run([other], depth, score, INFINITY)
+                if again is None:
+                    return None
+                if again[0][1] > score:
+                    move, score, pv = again[0][:3]
+        return move, score, pv
+
+    def _run(self, moves: list, depth: int, alpha: int, beta: int):
+        """searches root moves in the worker processes at once and returns
+        their results in the same order, or None if any did not finish"""
+        if not moves:
+            return []
+        pool = self._executor()
+        #the node budget left is shared out between the moves
+        budget = None if self.limits.nodes is None else max((self.limits.nodes - self.nodes) // len(moves), 1)
+        futures = [pool.submit(_search_root_move, self._position, move, depth, alpha, beta,
+                               budget, self._deadline, self.seed is not None) for move in moves]
+        #results are merged in root move order, never in the order they finish
+        results = [future.result() for future in futures]
+        for _, _, _, nodes, qnodes, probes, hits, _ in results:
+            self.nodes += nodes + 1
+            self.qnodes += qnodes
+            self.probes += probes
+            self.hits += hits
+        if not all(finished for *_, finished in results):
+            return None
+        return results
+
+
+#Positions that once tripped the parallel search up, as FEN, depth and node budget:
+#a reply with a forced mate, which ends that move's search early, and a root
+#with a single legal move searched under a node budget
+REGRESSIONS = [('4k3/r7/8/8/3N4/8/6PP/7K w - - 0 1', 5, None),
+               ('k7/8/8/8/8/8/1r6/K7 w - - 0 1', None, 5000)]
+
+
+def check_regressions(workers: int = 1) -> list:
+    """returns a message for every REGRESSIONS position where the parallel
+    search fails, or does not reach the depth the single process Search does"""
+    from fen import position_from_fen
+    problems = []
+    with ParallelSearch(workers, seed=0) as search:
+        for fen, depth, nodes in REGRESSIONS:
+            limits = SearchLimits(depth, nodes)
+            try:
+                result = search.search(Game(backend='array', position=position_from_fen(fen)), limits=limits)
+            except Exception as error:
+                problems.append(f'{fen}: {type(error).__name__} {error}')
+                continue
+            expected = Search().search(Game(backend='array', position=position_from_fen(fen)), limits=limits)
+            if result.move is None or depth is not None and result.depth != expected.depth:
+                problems.append(f'{fen}: depth {result.depth}, Search reaches {expected.depth}')
+    return problems
+
+
+def benchmark_positions(count: int = 8, plies: int = 12) -> list:
+    """returns a fixed set of positions from seeded random games"""
+    rnd = random.Random(0)
+    positions = []
+    for _ in range(count):
+        game = Game(backend='array')
+        for _ in range(plies):
+            moves = game.legal_moves(game.current_player)
+            if not moves:
+                break
+            game.make_move(*rnd.choice(moves))
+        positions.append(game.position())
+    return positions
+
+
+def benchmark(workers: int = None, depth: int = 4, seed: int = 0) -> dict:
+    """returns the seconds and nodes the single process Search and workers
+    take over the benchmark positions, the speedup of the workers over
+    Search and whether every best move agreed"""
+    positions = benchmark_positions()
+    start = time.perf_counter()
+    serial = [Search(TranspositionTable(16)).search(Game(backend='array', position=position), depth)
+              for position in positions]
+    serial_seconds = time.perf_counter() - start
+    with ParallelSearch(workers, seed) as search:
+        #the pool starts outside the timing
+        search._executor().submit(time.sleep, 0).result()
+        start = time.perf_counter()
+        parallel = [search.search(Game(backend='array', position=position), depth) for position in positions]
+        parallel_seconds = time.perf_counter() - start
+    return {'positions': len(positions), 'depth': depth, 'workers': search.workers,
+            'serial_seconds': serial_seconds, 'parallel_seconds': parallel_seconds,
+            'serial_nodes': sum(result.nodes for result in serial),
+            'parallel_nodes': sum(result.nodes for result in parallel),
+            'speedup': serial_seconds / parallel_seconds if parallel_seconds else 0.0,
+            'same_moves': [result.move for result in serial] == [result.move for result in parallel]}
+
+
+def benchmark_tables(workers: int = None, depth: int = 4) -> dict:
+    """returns the table hit rate, nodes and seconds over the benchmark
+    positions with a table per worker and with one shared table"""
+    results = {}
+    for shared in (False, True):
+        with ParallelSearch(workers, table_mb=16, shared=shared) as search:
+            search._executor().submit(time.sleep, 0).result()
+            nodes = probes = hits = 0
+            start = time.perf_counter()
+            for position in benchmark_positions():
+                nodes += search.search(Game(backend='array', position=position), depth).nodes
+                probes += search.probes
+                hits += search.hits
+            results['shared' if shared else 'private'] = {
+                'nodes': nodes, 'hit_rate': hits / probes if probes else 0.0,
+                'seconds': time.perf_counter() - start}
+    results['node_reduction'] = 1 - results['shared']['nodes'] / results['private']['nodes']
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    problems = check_regressions()
+    print('regressions: ' + ('; '.join(problems) if problems else 'none'))
+    report = benchmark(workers)
+    print(f'{report["positions"]} positions at depth {report["depth"]}')
+    print(f'     Search: {report["serial_seconds"]:8.2f} s, {report["serial_nodes"]:10,} nodes')
+    print(f'{report["workers"]:>3} workers: {report["parallel_seconds"]:8.2f} s, {report["parallel_nodes"]:10,} nodes, '
+          f'speedup {report["speedup"]:.2f}x, same moves {report["same_moves"]}')
+    tables = benchmark_tables(workers)
+    for kind in ('private', 'shared'):
+        print(f'{kind:>8} tables: {tables[kind]["nodes"]:10,} nodes, hit rate '
+              f'{tables[kind]["hit_rate"]:.1%}, {tables[kind]["seconds"]:.2f} s')
+    print(f'shared table saves {tables["node_reduction"]:.1%} of the nodes')
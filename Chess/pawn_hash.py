@@ -0,0 +1,106 @@
+"""
+Pawn structure evaluation, cached in a table keyed by a Zobrist hash of
+the pawns alone. Game keeps that key up to date only when a pawn is
+placed or lifted. Since pawns move rarely, most evaluations find their
+pawn structure already worked out.
+"""
+from array import array
+from piece_codes import PAWN, KIND_MASK, BLACK
+
+#Centipawns for each pawn on a file beyond the first, and for each pawn
+#with no pawn of its own color on either neighbouring file
+DOUBLED_PAWN = -10
+ISOLATED_PAWN = -10
+#Centipawns for a passed pawn by its row counted from its own side of the board
+PASSED_PAWN = [0, 0, 5, 10, 20, 35, 60, 100]
+#Each entry is a 64 bit key, a 32 bit score and a passed pawn mask per color
+ENTRY_BYTES = 28
+
+
+def pawn_structure(squares) -> tuple[int, int, int]:
+    """returns the doubled, isolated and passed pawn score for white of 64
+    piece codes, with the squares of white's and of black's passed pawns as
+    bitmasks"""
+    pawns = ([], [])
+    files = ([0] * 8, [0] * 8)
+    for square, code in enumerate(squares):
+        if code & KIND_MASK == PAWN:
+            color = 1 if code & BLACK else 0
+            pawns[color].append(square)
+            files[color][square & 7] += 1
+    score = 0
+    passed = [0, 0]
+    for color, sign in ((0, 1), (1, -1)):
+        own, enemy = files[color], pawns[color ^ 1]
+        for file, count in enumerate(own):
+            if count > 1:
+                score += sign * (count - 1) * DOUBLED_PAWN
+            if count and not (file > 0 and own[file - 1] or file < 7 and own[file + 1]):
+                score += sign * count * ISOLATED_PAWN
+        for square in pawns[color]:
+            y, x = divmod(square, 8)
+            #white moves up the board and black down
+            if any(abs((other & 7) - x) <= 1 and (other >> 3 > y if color == 0 else other >> 3 < y)
+                   for other in enemy):
+                continue
+            passed[color] |= 1 << square
+            score += sign * PASSED_PAWN[y if color == 0 else 7 - y]
+    return score, passed[0], passed[1]
+
+
+class PawnHashTable:
+    """A bounded, array backed table of pawn structure results, one entry
+    per index, always replaced"""
+    def __init__(self, size_kb: int = 256):
+        """Creates the instance variables
+
+        _keys, _scores, _passed:
+            the pawn key, score and passed pawn masks (white's then black's)
+            of every entry, allocated once.
+        _mask:
+            picks an entry from a key, the entry count is a power of two.
+        """
+        entries = 1
+        while entries * 2 * ENTRY_BYTES <= size_kb * 1024:
+            entries *= 2
+        self.size = entries
+        self._mask = entries - 1
+        self._keys = array('Q', bytes(8 * entries))
+        self._scores = array('i', bytes(4 * entries))
+        self._passed = array('Q', bytes(16 * entries))
+        self.clear()
+
+    def clear(self) -> None:
+        """empties the table and resets its statistics"""
+        self._keys[:] = array('Q', bytes(8 * self.size))
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.filled = 0
+
+    def probe(self, game) -> tuple[int, int, int]:
+        """returns the pawn structure of the game as pawn_structure does,
+        from the table when it is there and worked out and stored when not"""
+        self.probes += 1
+        #a key of 0 marks an empty entry, so it is stored as 1
+        key = game._pawn_hash or 1
+        index = key & self._mask
+        if self._keys[index] == key:
+            self.hits += 1
+            return self._scores[index], self._passed[2 * index], self._passed[2 * index + 1]
+        score, white, black = pawn_structure(game._squares)
+        self.stores += 1
+        if not self._keys[index]:
+            self.filled += 1
+        self._keys[index] = key
+        self._scores[index] = score
+        self._passed[2 * index] = white
+        self._passed[2 * index + 1] = black
+        return score, white, black
+
+    def stats(self) -> dict:
+        """returns the probes, hits, stores and how full the table is"""
+        return {'probes': self.probes, 'hits': self.hits,
+                'hit_rate': self.hits / self.probes if self.probes else 0.0,
+                'stores': self.stores, 'fill': self.filled / self.size,
+                'size_kb': self.size * ENTRY_BYTES / 1024}
@@ -0,0 +1,143 @@
+"""
+Perft: counts the leaf nodes of the game tree to a fixed depth, to check
+the move generators against known counts and to time them.
+
+    python perft.py [depth] [--divide] [--method reference|legal|bitboard] [--fen FEN]
+    python perft.py --suite
+"""
+import time
+from piece_model import Game
+from fen import START, position_from_fen
+
+#The ways of walking the tree: the Piece classes with Game.move and undo,
+#Game.legal_moves with make_move and undo, and the bitboard engine's own
+#perft on a scratch copy of its bitboards
+METHODS = ('reference', 'legal', 'bitboard')
+
+#Positions with their leaf counts by depth under this game's rules, where pawns
+#step onto either diagonal and capture straight ahead and there is no castling
+#or en passant. The reference, legal and bitboard methods all give these counts.
+SUITE = [
+    ('start', START, (34, 1156, 40164, 1390089)),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w - - 0 1', (57, 2813, 160130, 7830212)),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', (18, 266, 4853, 78101)),
+    ('promotion', 'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1', (20, 332, 6164, 107289)),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', (55, 2959, 155489, 8134906)),
+]
+
+
+def reference_moves(game: Game) -> list:
+    """returns the moves of the player to move from valid_moves, including
+    those that would leave it in check, which Game.move refuses"""
+    moves = []
+    for y, x in game.get_piece_locations(game.current_player):
+        for y2, x2 in game.valid_moves(y, x):
+            #Knight.valid_moves lists the knight's own square
+            if (y2, x2) != (y, x):
+                moves.append((y, x, y2, x2))
+    return moves
+
+
+def perft(game: Game, depth: int, method: str = 'reference') -> int:
+    """returns the number of leaf nodes depth plies below the position"""
+    if depth == 0:
+        return 1
+    if method == 'bitboard':
+        return game._engine.perft(game.current_player.value, depth)
+    nodes = 0
+    if method == 'legal':
+        for move in game.legal_moves(game.current_player):
+            #the last ply only has to be counted, not played
+            if depth == 1:
+                nodes += 1
+                continue
+            game.make_move(*move)
+            nodes += perft(game, depth - 1, method)
+            game.undo()
+        return nodes
+    for y, x, y2, x2 in reference_moves(game):
+        if game.move(game.get(y, x), y, x, y2, x2):
+            if depth > 1:
+                nodes += perft(game, depth - 1, method)
+            else:
+                nodes += 1
+            game.undo()
+    return nodes
+
+
+def divide(game: Game, depth: int, method: str = 'reference') -> dict:
+    """returns the leaf count below each root move, keyed by (y, x, y2, x2)"""
+    counts = {}
+    #the root moves come from the Piece classes for the bitboard method too,
+    #each one's count then from the bitboard perft
+    moves = game.legal_moves(game.current_player) if method == 'legal' else reference_moves(game)
+    for y, x, y2, x2 in moves:
+        if method == 'legal':
+            game.make_move(y, x, y2, x2)
+        elif not game.move(game.get(y, x), y, x, y2, x2):
+            continue
+        counts[(y, x, y2, x2)] = perft(game, depth - 1, method)
+        game.undo()
+    return counts
+
+
+def load(fen: str = START, method: str = 'reference') -> Game:
+    """returns a game at the position of a FEN set up for a method"""
+    if method not in METHODS:
+        raise ValueError('You must provide a valid perft method.')
+    return Game(position=position_from_fen(fen), engine='bitboard' if method == 'bitboard' else 'reference')
+
+
+def timed(game: Game, depth: int, method: str = 'reference') -> tuple[int, float]:
+    """returns the leaf count and the nodes per second of a perft"""
+    start = time.perf_counter()
+    nodes = perft(game, depth, method)
+    seconds = time.perf_counter() - start
+    return nodes, nodes / seconds if seconds > 0 else 0.0
+
+
+def run_suite(method: str = 'reference', max_depth: int = 3) -> list:
+    """returns (name, depth, expected, counted, nodes per second) for every
+    suite position up to max_depth plies"""
+    results = []
+    for name, fen, counts in SUITE:
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            nodes, rate = timed(load(fen, method), depth, method)
+            results.append((name, depth, expected, nodes, rate))
+    return results
+
+
+def _move_name(move) -> str:
+    """returns a move as coordinates such as e2e4"""
+    y, x, y2, x2 = move
+    return f'{"abcdefgh"[x]}{y + 1}{"abcdefgh"[x2]}{y2 + 1}'
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Count the leaf nodes of the game tree.')
+    parser.add_argument('depth', type=int, nargs='?', default=3)
+    parser.add_argument('--fen', default=START)
+    parser.add_argument('--method', choices=METHODS, default='reference')
+    parser.add_argument('--divide', action='store_true', help='count each root move separately')
+    parser.add_argument('--suite', action='store_true', help='check the reference positions up to depth')
+    args = parser.parse_args()
+    if args.suite:
+        failed = 0
+        for name, depth, expected, nodes, rate in run_suite(args.method, args.depth):
+            status = 'ok' if nodes == expected else f'FAILED, expected {expected}'
+            failed += nodes != expected
+            print(f'{name:>10} depth {depth}: {nodes:10,} nodes {rate:12,.0f} nodes/s {status}')
+        raise SystemExit(1 if failed else 0)
+    game = load(args.fen, args.method)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(game, args.depth, args.method)
+        for move in sorted(counts):
+            print(f'{_move_name(move)}: {counts[move]}')
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(game, args.depth, args.method)
+    seconds = time.perf_counter() - start
+    print(f'{game.current_player.name} to move, depth {args.depth}: {nodes:,} nodes '
+          f'in {seconds:.2f} s, {nodes / seconds if seconds > 0 else 0.0:,.0f} nodes/s')
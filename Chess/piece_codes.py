@@ -0,0 +1,20 @@
+"""
+Compact one byte codes for the pieces, used by the array backed board
+and anything else that wants to look at a position without Piece objects
+"""
+
+#An empty square
+EMPTY = 0
+#The kind of piece is kept in the low 3 bits
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+KIND_MASK = 7
+#Set for black pieces, clear for white pieces
+BLACK = 8
+#Set for pawns that have already moved
+MOVED = 16
+
@@ -7,8 +7,12 @@ Python Version: 3.10
 import copy
 from enum import Enum
 from abc import ABC, abstractmethod
-import pygame as pg, pygame
 import random
+from piece_codes import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, KIND_MASK, BLACK, MOVED
+from attack_tables import (SQUARE_COORDS, DIRECTION_INDEX, ORTHOGONAL, DIAGONAL, ALL_DIRECTIONS, RAY_SQUARES,
+                           NORTH, SOUTH, KNIGHT_TARGETS, KING_TARGETS, PAWN_PUSHES, PAWN_CAPTURES)
+from zobrist import PIECE_KEYS, SIDE_KEY, PAWN_KEYS, position_hash, pawn_hash
+from evaluation import MG_SCORES, EG_SCORES, PHASES, totals
 
 class Color(Enum):
     """Creates an enumeration used to define the colors of the pieces"""
@@ -21,9 +25,10 @@ class Piece(ABC):
     """Creates an abstract class of how a chess piece acts"""
     #Keeps track of current game
     _game = None
-    #The image path for the pieces
-    #SPRITESHEET = None
-    SPRITESHEET = pygame.image.load("images/pieces.png")
+    #The kind of piece stored in its one byte code
+    KIND = EMPTY
+    #The shared sprite atlas, only created once the GUI asks for an image
+    ATLAS = None
 
     @staticmethod
     def set_game(game):
@@ -33,27 +38,53 @@ class Piece(ABC):
             raise ValueError('You must provide a valid game instance.')
         Piece._game = game
 
+    @staticmethod
+    def set_atlas(atlas) -> None:
+        """Lets the GUI hand over its sprite atlas, all pieces
+        of the same type and color will share one image from it"""
+        Piece.ATLAS = atlas
+
     def __init__(self, color: Color):
         """Create the instance variables
 
         _color:
             is set equal to Color, WHITE or BLACK
-        _image:
-            holds the image for each piece
+        _sprite:
+            the x and y pixel offset of the pieces image in the sprite sheet
         """
         self._color = color
-        self._image = pygame.Surface((105, 105), pg.SRCALPHA)
-        #Piece.SPRITESHEET = pygame.image.load("images/pieces.png")
+        #no graphics are held by a piece, so the rules run headless
+        self._sprite = (0, 0)
 
     @property
     def color(self) -> Color:
         """returns an instance of _color"""
         return self._color
 
+    @property
+    def code(self) -> int:
+        """returns the one byte code of the piece, see piece_codes"""
+        return self.KIND | (BLACK if self._color == Color.BLACK else 0)
+
+    @property
+    def sprite(self) -> tuple[int, int]:
+        """returns the pixel offset of the pieces image in the sprite sheet"""
+        return self._sprite
+
     def set_image(self, x: int, y: int) -> None:
-        """takes an x and y value and copies image file to
-        a 105x105 pixel chunk into the pieces image"""
-        self._image.blit(Piece.SPRITESHEET, (0, 0), pygame.rect.Rect(x, y, 105, 105))
+        """takes an x and y value and remembers where the pieces
+        105x105 pixel chunk is in the sprite sheet"""
+        self._sprite = (x, y)
+
+    @property
+    def image(self):
+        """returns the shared image for this kind of piece, the atlas
+        is only built the first time an image is asked for"""
+        if Piece.ATLAS is None:
+            #pygame is only needed once something wants to draw
+            from sprite_atlas import SpriteAtlas
+            Piece.ATLAS = SpriteAtlas()
+        return Piece.ATLAS.image(self._sprite)
 
     def _diagonal_moves(self, y: int, x: int, y_d: int, x_d: int, distance: int) -> list[tuple[int, int]]:
         """Creates all the possible diagonal moves a piece can make
@@ -71,23 +102,8 @@ class Piece(ABC):
         distance:
             How many spaces the moves are calculated for.
         """
-        #list of all valid moves
-        moves = []
-        #checks the range of i from 1 to maximum distance
-        for i in range(1, distance + 1):
-            #multiplies index by the distance traveled plus coordinate to get diagonal
-            new_y = y + i * y_d
-            new_x = x + i * x_d
-            if new_y < 0 or new_y > 7 or new_x < 0 or new_x > 7:
-                break
-            elif self._game.board[new_y][new_x] is None:
-                moves.append((new_y, new_x))
-            elif self._game.board[new_y][new_x].color != self._color:
-                moves.append((new_y, new_x))
-                break
-            elif self._game.board[new_y][new_x].color is not None and self._game.board[new_y][new_x].color == self.color:
-                break
-        return moves
+        #walks the precomputed ray in this direction
+        return self._ray_moves(y, x, DIRECTION_INDEX[(y_d, x_d)], distance)
 
     def _horizontal_moves(self, y: int, x: int, y_d: int, x_d: int, distance: int) -> list[tuple[int, int]]:
         """Creates all the possible horizontal moves a piece can make.
@@ -107,30 +123,8 @@ class Piece(ABC):
         distance:
             How many spaces the moves are calculated for.
         """
-        #list of all valid moves
-        moves = []
-        #checks the range of i from 1 to max distance
-        for i in range(1, distance + 1):
-            #the y does not change for horizontal
-            new_y = y
-            #current coordinate plus index multiplied by distance moved
-            new_x = x + i * x_d
-            #if x is out of bounds break
-            if new_x < 0 or new_x > 7:
-                break
-            #if location is None add to moves list
-            elif self._game.board[new_y][new_x] is None:
-                moves.append((new_y, new_x))
-            #if location has an opposite color piece add to moves list
-            elif self._game.board[new_y][new_x].color != self._color:
-                moves.append((new_y, new_x))
-                #break because you cannot jump over a piece
-                break
-            #anything else break
-            else:
-                break
-        #return the moves list
-        return moves
+        #the y does not change for horizontal, walks the precomputed ray
+        return self._ray_moves(y, x, DIRECTION_INDEX[(0, x_d)], distance)
 
     def _vertical_moves(self, y: int, x: int, y_d: int, x_d: int, distance: int) -> list[tuple[int, int]]:
         """Creates all the possible horizontal moves a piece can make.
@@ -150,23 +144,33 @@ class Piece(ABC):
         distance:
             How many spaces the moves are calculated for.
         """
+        #x coordinate does not change, walks the precomputed ray
+        return self._ray_moves(y, x, DIRECTION_INDEX[(y_d, 0)], distance)
+
+    def _ray_moves(self, y: int, x: int, direction: int, distance: int) -> list[tuple[int, int]]:
+        """Walks a precomputed ray (see attack_tables) out from a square.
+
+        Stops at the edge of the board, before a piece of the same color or
+        after a piece of the opposite color, and never goes past distance.
+        """
+        return self._walk(RAY_SQUARES[direction][y * 8 + x][:distance])
+
+    def _walk(self, targets: list[int]) -> list[tuple[int, int]]:
+        """returns the squares of an ordered list of targets up to the first
+        piece, including it if it is of the opposite color"""
         #list of valid moves
         moves = []
-        #checks the range of i from 1 to mx distance
-        for i in range(1, distance + 1):
-            #current coordinate plus index multiplied by distance traveled
-            new_y = y + i * y_d
-            #x coordinate does not change
-            new_x = x
-            #if y is out of bounds break
-            if new_y < 0 or new_y > 7:
-                break
+        squares = self._game._squares
+        #the color bit of this piece
+        own = BLACK if self._color == Color.BLACK else 0
+        for target in targets:
+            code = squares[target]
             #if location is None add to moves list
-            elif self._game.board[new_y][new_x] is None:
-                moves.append((new_y, new_x))
-            #if location is a piece of opposite color add to moves list
-            elif self._game.board[new_y][new_x].color is not None and self._game.board[new_y][new_x].color != self._color:
-                moves.append((new_y, new_x))
+            if code == EMPTY:
+                moves.append(SQUARE_COORDS[target])
+            #if location has an opposite color piece add to moves list
+            elif code & BLACK != own:
+                moves.append(SQUARE_COORDS[target])
                 #break because you cannot jump over a piece
                 break
             #anything else break
@@ -175,6 +179,14 @@ class Piece(ABC):
         #return the moves list
         return moves
 
+    def _step_moves(self, targets: list[int]) -> list[tuple[int, int]]:
+        """returns the precomputed target squares that are empty or hold
+        a piece of the opposite color"""
+        squares = self._game._squares
+        own = BLACK if self._color == Color.BLACK else 0
+        return [SQUARE_COORDS[target] for target in targets
+                if squares[target] == EMPTY or squares[target] & BLACK != own]
+
     def get_diagonal_moves(self, y: int, x: int, distance: int) -> list[tuple[int, int]]:
         """returns all possible diagonal moves a piece can make"""
         #list of all diagonal moves
@@ -232,6 +244,8 @@ class Piece(ABC):
 class King(Piece):
     """inherits from the Piece class, defines all moves
     a King is able to make"""
+    KIND = KING
+
     def __init__(self, color: Color):
         """sets the image of a piece depending on its color"""
         Piece.__init__(self, color)
@@ -243,21 +257,8 @@ class King(Piece):
 
     def valid_moves(self, y: int, x: int) -> list[tuple[int, int]]:
         """lists all valid moves for the King"""
-        #list of moves
-        moves = []
-        #list of diagonal moves
-        moves += self._diagonal_moves(y, x, -1, -1, 1)
-        moves += self._diagonal_moves(y, x, 1, -1, 1)
-        moves += self._diagonal_moves(y, x, -1, 1, 1)
-        moves += self._diagonal_moves(y, x, 1, 1, 1)
-        #list of horizontal moves
-        moves += self._horizontal_moves(y, x, 0, -1, 1)
-        moves += self._horizontal_moves(y, x, 0, 1, 1)
-        #list of vertical moves
-        moves += self._vertical_moves(y, x, -1, 0, 1)
-        moves += self._vertical_moves(y, x, 1, 0, 1)
-        #returns moves list
-        return moves
+        #the eight neighbouring squares
+        return self._step_moves(KING_TARGETS[y * 8 + x])
 
     def copy(self):
         """returns a new King of the same color"""
@@ -267,6 +268,8 @@ class King(Piece):
 class Queen(Piece):
     """inherits from the Piece class, defines all moves
     a Queen is able to make"""
+    KIND = QUEEN
+
     def __init__(self, color: Color):
         """sets the image of a piece depending on its color"""
         Piece.__init__(self, color)
@@ -280,17 +283,9 @@ class Queen(Piece):
         """lists all valid moves for the Queen"""
         #list of moves
         moves = []
-        #list of diagonal moves
-        moves += self._diagonal_moves(y, x, -1, -1, 8)
-        moves += self._diagonal_moves(y, x, 1, -1, 8)
-        moves += self._diagonal_moves(y, x, -1, 1, 8)
-        moves += self._diagonal_moves(y, x, 1, 1, 8)
-        #list of horizontal moves
-        moves += self._horizontal_moves(y, x, 0, -1, 8)
-        moves += self._horizontal_moves(y, x, 0, 1, 8)
-        #list of vertical moves
-        moves += self._vertical_moves(y, x, -1, 0, 8)
-        moves += self._vertical_moves(y, x, 1, 0, 8)
+        #diagonal, horizontal and vertical moves
+        for direction in ALL_DIRECTIONS:
+            moves += self._ray_moves(y, x, direction, 8)
         #return moves list
         return moves
 
@@ -302,6 +297,8 @@ class Queen(Piece):
 class Bishop(Piece):
     """inherits from the Piece class, defines all moves
     a Bishop is able to make"""
+    KIND = BISHOP
+
     def __init__(self, color: Color):
         """sets the image of a piece depending on its color"""
         Piece.__init__(self, color)
@@ -316,10 +313,8 @@ class Bishop(Piece):
         #list of moves
         moves = []
         #diagonal moves
-        moves += self._diagonal_moves(y, x, -1, -1, 8)
-        moves += self._diagonal_moves(y, x, 1, -1, 8)
-        moves += self._diagonal_moves(y, x, -1, 1, 8)
-        moves += self._diagonal_moves(y, x, 1, 1, 8)
+        for direction in DIAGONAL:
+            moves += self._ray_moves(y, x, direction, 8)
         #returns list of moves
         return moves
 
@@ -332,6 +327,8 @@ class Bishop(Piece):
 class Knight(Piece):
     """inherits from the Piece class, defines all moves
     a Knight is able to make"""
+    KIND = KNIGHT
+
     def __init__(self, color: Color):
         """sets the image of a piece depending on its color"""
         Piece.__init__(self, color)
@@ -343,30 +340,9 @@ class Knight(Piece):
 
     def valid_moves(self, y: int, x: int) -> list[tuple[int, int]]:
         """lists all valid moves for the Knight"""
-        #list of moves
-        moves = []
-        bad_moves = []
-        #a list of all possible move formations
-        l_shape_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                         (1, -2), (1, 2), (2, -1), (2, 1)]
-        #looking in each move formation
-        for move in l_shape_moves:
-            #move piece to new y coordinate
-            new_y = y + move[0]
-            #move piece to new x coordinate
-            new_x = x + move[1]
-            #if piece out of bounds break
-            if new_y < 0 or new_y > 7 or new_x < 0 or new_x > 7:
-                continue
-            #if piece in new coordinate is same color remove location from l_shape_moves
-            if self._game.board[new_y][new_x] is not None and self._game.board[new_y][new_x].color == self._color:
-                bad_moves.append((new_y, new_x))
-            else:
-                moves.append((new_y, new_x))
-
-        valid_moves = [move for move in moves if move not in bad_moves]
-        if self._game.board[y][x] is not None and self._game.board[y][x].color != self.color:
-            bad_moves.append((y, x))
+        #the L shaped squares that are not held by the same color
+        valid_moves = self._step_moves(KNIGHT_TARGETS[y * 8 + x])
+        #the knight's own square has always been listed as well
         valid_moves.append((y, x))
         return valid_moves
 
@@ -379,6 +355,8 @@ class Knight(Piece):
 class Rook(Piece):
     """inherits from the Piece class, defines all moves
     a Rook is able to make"""
+    KIND = ROOK
+
     def __init__(self, color: Color):
         """sets the image of a piece depending on its color"""
         Piece.__init__(self, color)
@@ -392,12 +370,9 @@ class Rook(Piece):
         """lists all valid moves for the Rook"""
         #moves list
         moves = []
-        #horizontal moves
-        moves += self._horizontal_moves(y, x, 0, -1, 8)
-        moves += self._horizontal_moves(y, x, 0, 1, 8)
-        #vertical moves
-        moves += self._vertical_moves(y, x, -1, 0, 8)
-        moves += self._vertical_moves(y, x, 1, 0, 8)
+        #horizontal and vertical moves
+        for direction in ORTHOGONAL:
+            moves += self._ray_moves(y, x, direction, 8)
         #return list of moves
         return moves
 
@@ -410,6 +385,8 @@ class Rook(Piece):
 class Pawn(Piece):
     """inherits from the Piece class, defines all moves
     a Pawn is able to make"""
+    KIND = PAWN
+
     def __init__(self, color: Color):
         """sets the image of a piece depending on its color"""
         Piece.__init__(self, color)
@@ -424,115 +401,332 @@ class Pawn(Piece):
         """lists all valid moves for the Pawn"""
         #moves list
         moves = []
-        #vertical moves
-        if self.color == Color.BLACK:
-            moves += self._vertical_moves(y, x, -1, 0, 1)
-        if self.color == Color.WHITE:
-            moves += self._vertical_moves(y, x, 1, 0, 1)
-
-        #if White Pawn has not moved, can also move forward 2 spaces
-        if not self.moved and self.color == Color.WHITE:
-            moves += self._vertical_moves(y, x, 1, 0, 2)
-        #if Black Pawn has not moved, can also move forward 2 spaces
-        if not self.moved and self.color == Color.BLACK:
-            moves += self._vertical_moves(y, x, -1, 0, 2)
-
-        #if White Pawn and enemy in diagonal, add to move list
-        if self.color == Color.WHITE and self._diagonal_moves(y, x, 1, -1, 1) != self._color and not None:
-            moves += self._diagonal_moves(y, x, 1, -1, 1)
-        #if White Pawn and enemy in diagonal, add to move list
-        if self.color == Color.WHITE and self._diagonal_moves(y, x, 1, 1, 1) != self.color and not None:
-            moves += self._diagonal_moves(y, x, 1, 1, 1)
-        #if Black Pawn and enemy in diagonal, add to move list
-        if self.color == Color.BLACK and self._diagonal_moves(y, x, -1, -1, 1) != self.color and not None:
-            moves += self._diagonal_moves(y, x, -1, -1, 1)
-        #if Black Pawn and enemy in diagonal, add to move list
-        if self.color == Color.BLACK and self._diagonal_moves(y, x, -1, 1, 1) != self.color and not None:
-            moves += self._diagonal_moves(y, x, -1, 1, 1)
+        color = 1 if self.color == Color.BLACK else 0
+        #vertical moves, 2 spaces forward if the pawn has not moved
+        moves += self._walk(PAWN_PUSHES[color][y * 8 + x][:1 if self.moved else 2])
+        #either diagonal, whether empty or held by the enemy, add to move list
+        moves += self._step_moves(PAWN_CAPTURES[color][y * 8 + x])
         #return list of moves
         return moves
 
+    @property
+    def code(self) -> int:
+        """returns the one byte code of the pawn, including whether it has moved"""
+        return super().code | (MOVED if self.moved else 0)
+
     def copy(self):
         """returns a new Pawn of the same color"""
         new_pawn = Pawn(self.color)
         new_pawn._game = self._game
-        new_pawn.moved = True
+        new_pawn.moved = self.moved
         return new_pawn
 
+#The piece class for each kind of piece code
+PIECE_TYPES = {KING: King, QUEEN: Queen, BISHOP: Bishop, KNIGHT: Knight, ROOK: Rook, PAWN: Pawn}
+#One shared piece per code for pieces that never change, pawns are left out since moved changes
+_SHARED_PIECES = {}
+
+def decode(code: int, shared: bool = False):
+    """returns a Piece for a one byte code, or None for an empty square
+
+    Parameters:
+    ----------
+    code:
+        The piece code, see piece_codes.
+    shared:
+        If True a piece that never changes is reused instead of created.
+    """
+    if code == EMPTY:
+        return None
+    if shared and code in _SHARED_PIECES:
+        return _SHARED_PIECES[code]
+    piece = PIECE_TYPES[code & KIND_MASK](Color.BLACK if code & BLACK else Color.WHITE)
+    if code & KIND_MASK == PAWN:
+        piece.moved = bool(code & MOVED)
+    elif shared:
+        _SHARED_PIECES[code] = piece
+    return piece
+
+class ArrayBoard:
+    """An 8x8 view over a flat bytearray of piece codes, so code written
+    for board[y][x] keeps working on the array backend"""
+    def __init__(self, game: 'Game'):
+        """_game is the Game whose 64 byte board the view reads from and
+        whose set every write goes through"""
+        self._game = game
+
+    def __getitem__(self, y: int):
+        """returns a view of one row of the board"""
+        if y < 0 or y > 7:
+            raise IndexError('board row out of range')
+        return _ArrayRow(self._game, y)
+
+    def __len__(self) -> int:
+        """the board always has 8 rows"""
+        return 8
+
+    def __iter__(self):
+        """iterates over the rows of the board"""
+        for y in range(8):
+            yield _ArrayRow(self._game, y)
+
+class _ArrayRow:
+    """One row of an ArrayBoard, decodes pieces as they are read"""
+    def __init__(self, game: 'Game', y: int):
+        self._game = game
+        self._squares = game._squares
+        self._y = y
+        self._start = y * 8
+
+    def __getitem__(self, x: int):
+        """returns the piece in column x of the row"""
+        if x < 0 or x > 7:
+            raise IndexError('board column out of range')
+        return decode(self._squares[self._start + x], True)
+
+    def __setitem__(self, x: int, piece) -> None:
+        """puts a piece in column x of the row through Game.set, so the
+        hash, piece locations and listeners follow"""
+        if x < 0 or x > 7:
+            raise IndexError('board column out of range')
+        self._game.set(self._y, x, piece)
+
+    def __len__(self) -> int:
+        """a row always has 8 columns"""
+        return 8
+
+    def __iter__(self):
+        """iterates over the pieces of the row"""
+        for x in range(8):
+            yield decode(self._squares[self._start + x], True)
+
+class _ListRow(list):
+    """One row of the list backend's board, a list of pieces whose writes
+    go through Game.set so _squares and everything kept from it follow"""
+    def __init__(self, game: 'Game', y: int, pieces):
+        super().__init__(pieces)
+        self._game = game
+        self._y = y
+
+    def __setitem__(self, x, piece) -> None:
+        """puts a piece in column x of the row through Game.set"""
+        if isinstance(x, slice):
+            raise TypeError('board rows can only be set one square at a time')
+        if x < -8 or x > 7:
+            raise IndexError('board column out of range')
+        self._game.set(self._y, x % 8, piece)
+
 class Game:
-    def __init__(self):
+    #The ways the board can be stored
+    BACKENDS = ('list', 'array')
+    #The move generators valid_moves can use
+    ENGINES = ('reference', 'bitboard')
+    #The search used for the computer player, shared by every game so its
+    #transposition table is allocated once
+    SEARCH = None
+
+    def __init__(self, backend: str = 'list', position: bytes = None, engine: str = 'reference'):
         """Creates the instance variables
 
+        backend:
+            'list' keeps an 8x8 list of Piece objects, 'array' keeps only
+            a 64 byte array of piece codes and decodes pieces when read.
+        position:
+            a position from position() to start from instead of the default setup.
+        engine:
+            'reference' asks the Piece classes for moves, 'bitboard' uses
+            the bitboard generator, which gives the same moves.
+
         board:
             Creates the chess board.
         current_player:
             keeps track of which players turn it is.
         prior_state:
-            keeps a copy of the prior state of the board.
+            a stack of undo records, one small tuple per move played.
+        counters:
+            how often the whole board had to be scanned and how often
+            piece locations and kings were looked up.
         """
+        if backend not in Game.BACKENDS:
+            raise ValueError('You must provide a valid board backend.')
+        if engine not in Game.ENGINES:
+            raise ValueError('You must provide a valid move engine.')
+        self.backend = backend
+        self.engine = engine
+        #the piece code of every square, kept up to date for both backends
+        self._squares = bytearray(64)
+        #objects told about every square that changes (see set)
+        self._listeners = []
+        #the squares of each colors pieces and king, indexed by Color value
+        self._locations = [set(), set()]
+        self._kings = [None, None]
+        #the Zobrist hash of the pieces, the player to move is mixed in by hash
+        self._hash = 0
+        #the Zobrist hash of the pawns alone, for the pawn hash table
+        self._pawn_hash = 0
+        #the running evaluation totals and game phase (see evaluation)
+        self._middlegame = 0
+        self._endgame = 0
+        self._phase = 0
+        self.counters = {'board_scans': 0, 'location_queries': 0, 'king_queries': 0}
+        self._engine = None
+        if engine == 'bitboard':
+            from bitboard import BitboardEngine
+            self._engine = BitboardEngine(self)
+            self._listeners.append(self._engine)
         #sets current player
         self.current_player = Color.WHITE
         #initializes the board
-        self.board = [[None for _ in range(8)] for _ in range(8)]
+        self._clear()
         #creates an empty list for prior states
         self.prior_state = []
         #sets up the pieces
-        self._setup_pieces()
+        if position is None:
+            self._setup_pieces()
+        else:
+            self._load(position)
 
     def reset(self):
         """resets the board back to the default state"""
         #sets the current player
         self.current_player = Color.WHITE
         #initializes the board
-        self.board = [[None for _ in range(8)] for _ in range(8)]
+        self._clear()
         #creates an empty list for prior states
         self.prior_state = []
         #sets up the pieces
         self._setup_pieces()
 
+    def _clear(self):
+        """empties every square of the board"""
+        self._squares[:] = bytes(64)
+        if self.backend == 'list':
+            self.board = [_ListRow(self, y, [None] * 8) for y in range(8)]
+        else:
+            self.board = ArrayBoard(self)
+        self._track_all()
+
+    def _load(self, position: bytes):
+        """sets the board and current player from a position() snapshot"""
+        self._squares[:] = position[:64]
+        self.current_player = Color(position[64])
+        if self.backend == 'list':
+            self.board = [_ListRow(self, y, [decode(self._squares[y * 8 + x]) for x in range(8)]) for y in range(8)]
+        self._track_all()
+
+    def _track_all(self):
+        """rebuilds the piece locations, kings and listeners from all 64 squares,
+        only needed when the whole board is replaced"""
+        self.counters['board_scans'] += 1
+        self._locations = [set(), set()]
+        self._kings = [None, None]
+        for square, code in enumerate(self._squares):
+            if code:
+                self._locations[code >> 3 & 1].add(square)
+                if code & KIND_MASK == KING:
+                    self._kings[code >> 3 & 1] = square
+        self._hash = position_hash(self._squares, False)
+        self._pawn_hash = pawn_hash(self._squares)
+        self._middlegame, self._endgame, self._phase = totals(self._squares)
+        for listener in self._listeners:
+            listener.reload(self._squares)
+
+    def position(self) -> bytes:
+        """returns the 64 piece codes followed by the current player, a
+        65 byte snapshot that can be hashed, compared and loaded again"""
+        return bytes(self._squares) + bytes((self.current_player.value,))
+
+    @property
+    def hash(self) -> int:
+        """returns the 64 bit Zobrist hash of the position, covering every
+        piece, whether each pawn has moved and the player to move"""
+        return self._hash ^ SIDE_KEY if self.current_player == Color.BLACK else self._hash
+
+    def set(self, y: int, x: int, piece) -> None:
+        """puts a piece (or None) on a square, keeping both backends
+        and every listener in step"""
+        square = y * 8 + x
+        old = self._squares[square]
+        new = piece.code if piece is not None else EMPTY
+        self._squares[square] = new
+        if self.backend == 'list':
+            #list.__setitem__ since the row's own would come back here
+            list.__setitem__(self.board[y], x, piece)
+        #swaps the old piece's key out of the hash and the new one's in
+        self._hash ^= PIECE_KEYS[old][square] ^ PIECE_KEYS[new][square]
+        #the pawn hash only changes when a pawn arrives or leaves
+        if old & KIND_MASK == PAWN or new & KIND_MASK == PAWN:
+            self._pawn_hash ^= PAWN_KEYS[old][square] ^ PAWN_KEYS[new][square]
+        #and the old piece's evaluation out of the totals and the new one's in
+        self._middlegame += MG_SCORES[new][square] - MG_SCORES[old][square]
+        self._endgame += EG_SCORES[new][square] - EG_SCORES[old][square]
+        self._phase += PHASES[new] - PHASES[old]
+        #keeps the piece locations and king squares up to date
+        if old:
+            self._locations[old >> 3 & 1].discard(square)
+            if old & KIND_MASK == KING and self._kings[old >> 3 & 1] == square:
+                self._kings[old >> 3 & 1] = None
+        if new:
+            self._locations[new >> 3 & 1].add(square)
+            if new & KIND_MASK == KING:
+                self._kings[new >> 3 & 1] = square
+        for listener in self._listeners:
+            listener.square_changed(square, old, new)
+
+    def valid_moves(self, y: int, x: int) -> list[tuple[int, int]]:
+        """returns the moves of the piece on a square from the selected engine"""
+        if self._engine is not None:
+            return self._engine.valid_moves(y, x)
+        piece = self.get(y, x)
+        if piece is None:
+            return []
+        #the pieces look at the board of whichever game is set
+        Piece.set_game(self)
+        return piece.valid_moves(y, x)
+
     def _setup_pieces(self):
         """sets up all pieces in their default positions
         on the board
         """
         #initializes the board
-        self.board = [[None for _ in range(8)] for _ in range(8)]
+        self._clear()
         #Creating a full row of pawns simultaneously
         for c in range(8):
             #White Pawns
-            self.board[1][c] = Pawn(Color.WHITE)
+            self.set(1, c, Pawn(Color.WHITE))
             #Black Pawns
-            self.board[6][c] = Pawn(Color.BLACK)
+            self.set(6, c, Pawn(Color.BLACK))
 
         #White Rooks
-        self.board[0][0] = Rook(Color.WHITE)
-        self.board[0][7] = Rook(Color.WHITE)
+        self.set(0, 0, Rook(Color.WHITE))
+        self.set(0, 7, Rook(Color.WHITE))
         #Black Rooks
-        self.board[7][0] = Rook(Color.BLACK)
-        self.board[7][7] = Rook(Color.BLACK)
+        self.set(7, 0, Rook(Color.BLACK))
+        self.set(7, 7, Rook(Color.BLACK))
 
         #White Knights
-        self.board[0][1] = Knight(Color.WHITE)
-        self.board[0][6] = Knight(Color.WHITE)
+        self.set(0, 1, Knight(Color.WHITE))
+        self.set(0, 6, Knight(Color.WHITE))
         #Black Knights
-        self.board[7][1] = Knight(Color.BLACK)
-        self.board[7][6] = Knight(Color.BLACK)
+        self.set(7, 1, Knight(Color.BLACK))
+        self.set(7, 6, Knight(Color.BLACK))
 
         #White Bishops
-        self.board[0][2] = Bishop(Color.WHITE)
-        self.board[0][5] = Bishop(Color.WHITE)
+        self.set(0, 2, Bishop(Color.WHITE))
+        self.set(0, 5, Bishop(Color.WHITE))
         #Black Bishops
-        self.board[7][2] = Bishop(Color.BLACK)
-        self.board[7][5] = Bishop(Color.BLACK)
+        self.set(7, 2, Bishop(Color.BLACK))
+        self.set(7, 5, Bishop(Color.BLACK))
 
         #White Queen
-        self.board[0][3] = Queen(Color.WHITE)
+        self.set(0, 3, Queen(Color.WHITE))
         #Black Queen
-        self.board[7][3] = Queen(Color.BLACK)
+        self.set(7, 3, Queen(Color.BLACK))
 
         #White King
-        self.board[0][4] = King(Color.WHITE)
+        self.set(0, 4, King(Color.WHITE))
         #Black King
-        self.board[7][4] = King(Color.BLACK)
+        self.set(7, 4, King(Color.BLACK))
 
     def get(self, y: int, x: int):
         """returns the pieces to their spots, returns None
@@ -540,6 +734,8 @@ class Game:
         #if the pieces are in the board return them to their position
         if y < 0 or y > 7 or x < 0 or x > 7:
             return None
+        if self.backend == 'array':
+            return decode(self._squares[y * 8 + x], True)
         return self.board[y][x]
 
     def switch_player(self):
@@ -552,77 +748,144 @@ class Game:
             return self.current_player == Color.WHITE
 
     def undo(self):
-        """if there is a prior board, reverts to it by using pop"""
+        """if there is a prior move, takes it back by using pop"""
         #checks if list is empty
         if len(self.prior_state) > 0:
-            #pops most recent board
-            self.prior_state.pop()
-            #sets board as the prior board
-            self.board = self.prior_state[-1]
+            #restores the squares the last move changed and gives the turn back
+            self._unmake()
+            self.current_player = Color.WHITE if self.current_player == Color.BLACK else Color.BLACK
             return True
         else:
             return False
 
     def copy_board(self):
         """copies the entire current game board"""
-        new_board = [[None for _ in range(8)] for _ in range(8)]
-        for y in range(8):
-            for x in range(8):
-                piece = self.board[y][x]
-                if piece is not None:
-                    new_board[y][x] = piece.copy()
-        new_game = Game()
-        new_game.board = new_board
-        return new_game
-
-    def move(self, piece: Piece, y: int, x: int, y2: int, x2: int) -> bool:
-        """moves the pieces on the board"""
-        #copies the current state of the board
-        self.prior_state.append(self.copy_board())
+        #copying the 64 byte codes is all it takes, no default pieces are set up first
+        return Game(self.backend, self.position(), self.engine)
 
-        self.board[y2][x2] = piece
-        self.board[y][x] = None
+    def _make(self, piece: Piece, y: int, x: int, y2: int, x2: int) -> None:
+        """plays a move in place and pushes its undo record, without
+        checking the move or switching players"""
+        captured = self.get(y2, x2)
+        was_moved = isinstance(piece, Pawn) and piece.moved
 
         #if the piece is a pawn, set moved to True
         if isinstance(piece, Pawn):
             piece.moved = True
 
+        self.set(y2, x2, piece)
+        self.set(y, x, None)
+
+        #a pawn reaching either end of the board becomes a Queen
+        promoted = isinstance(piece, Pawn) and (y2 == 0 or y2 == 7)
+        if promoted:
+            self.set(y2, x2, Queen(piece.color))
+
+        #the undo record: piece, from, to, captured piece, pawn moved flag, promotion
+        self.prior_state.append((piece, y, x, y2, x2, captured, was_moved, promoted))
+
+    def _unmake(self) -> None:
+        """pops the last undo record and puts back the two squares it changed"""
+        piece, y, x, y2, x2, captured, was_moved, promoted = self.prior_state.pop()
+        if isinstance(piece, Pawn):
+            piece.moved = was_moved
+        #the captured piece (or None) goes back first in case the piece never left its square
+        self.set(y2, x2, captured)
+        self.set(y, x, piece)
+
+    def make_move(self, y: int, x: int, y2: int, x2: int) -> None:
+        """plays the piece on a square without checking the move and
+        switches players, undo takes it back"""
+        self._make(self.get(y, x), y, x, y2, x2)
+        self.current_player = Color.WHITE if self.current_player == Color.BLACK else Color.BLACK
+
+    def move(self, piece: Piece, y: int, x: int, y2: int, x2: int) -> bool:
+        """moves the pieces on the board"""
+        #plays the move in place, remembering only what it changed
+        self._make(piece, y, x, y2, x2)
+
+        #a move that leaves the player in check is taken straight back
         if self.check(self.current_player):
-            self.board = self.prior_state.pop()
+            self._unmake()
             return False
 
-        if isinstance(piece, Pawn) and (y2 == 0 or y2 == 7):
-            self.board[y2][x2] = Queen(piece.color)
-
         self.current_player = Color.WHITE if self.current_player == Color.BLACK else Color.BLACK
         return True
 
     def get_piece_locations(self, color: Color) -> list[tuple[int, int]]:
         """returns the location of all pieces on the board"""
-        #list of locations
-        locations = []
-        for y in range(8):
-            for x in range(8):
-                #sets piece equal to a location
-                piece = self.get(y, x)
-                #if piece is not None and a color add it to locations list
-                if piece is not None and piece.color == color:
-                    locations.append((y, x))
+        self.counters['location_queries'] += 1
+        #list of locations from the tracked squares, in board order
+        locations = [SQUARE_COORDS[square] for square in sorted(self._locations[color.value])]
         #returns locations list
         return locations
 
     def find_king(self, color: Color) -> tuple[int, int]:
         """finds the exact location of the king based on color"""
-        for y in range(8):
-            for x in range(8):
-                #sets piece equal to a location
-                piece = self.get(y, x)
-                #if the piece is a king, return the location
-                if isinstance(piece, King) and piece.color == color:
-                    return (y, x)
+        self.counters['king_queries'] += 1
+        #the kings square is tracked as the king moves
+        square = self._kings[color.value]
+        if square is not None:
+            return SQUARE_COORDS[square]
+
+    def is_attacked(self, square: tuple[int, int], by_color: Color) -> bool:
+        """returns True if a piece of by_color could move to the square
+
+        Looks outward from the square along the knight, king, pawn and
+        slider rays and stops at the first attacker found, so no moves
+        are generated. Whatever is on the square itself is ignored.
+        """
+        return self._attacked(square[0] * 8 + square[1], by_color.value)
+
+    def _attacked(self, square: int, by: int) -> bool:
+        """is_attacked for a square number and Color value"""
+        squares = self._squares
+        bit = by << 3
+        knight = KNIGHT | bit
+        for target in KNIGHT_TARGETS[square]:
+            if squares[target] == knight:
+                return True
+        #pawns take straight ahead and step onto both diagonals, see Pawn.valid_moves
+        pawn = PAWN | bit
+        for target in PAWN_CAPTURES[by ^ 1][square]:
+            if squares[target] & ~MOVED == pawn:
+                return True
+        behind = RAY_SQUARES[SOUTH if by == 0 else NORTH][square]
+        if behind:
+            code = squares[behind[0]]
+            if code & ~MOVED == pawn:
+                return True
+            #an unmoved pawn two squares back reaches the square over an empty one
+            if code == EMPTY and len(behind) > 1 and squares[behind[1]] == pawn:
+                return True
+        king = KING | bit
+        for target in KING_TARGETS[square]:
+            if squares[target] == king:
+                return True
+        #the first piece along each ray is the only one that can reach the square
+        queen = QUEEN | bit
+        for directions, slider in ((ORTHOGONAL, ROOK | bit), (DIAGONAL, BISHOP | bit)):
+            for direction in directions:
+                for target in RAY_SQUARES[direction][square]:
+                    code = squares[target]
+                    if code:
+                        if code == slider or code == queen:
+                            return True
+                        break
+        return False
 
     def check(self, color: Color) -> bool:
         """checks if a player has been put in check"""
+        #finds the kings location
+        king = self._kings[color.value]
+        if king is None:
+            return False
+        #looks outward from the king for a piece of the opposite color
+        return self._attacked(king, color.value ^ 1)
+
+    def _check_by_moves(self, color: Color) -> bool:
+        """check worked out by generating every move of the opposite color,
+        slower than check but kept to verify it against"""
         #sets what the opposite color is based on current_player color
         opposite_color = Color.WHITE if color == Color.BLACK else Color.BLACK
         #sets locations equal to a list of all opposite colors pieces
@@ -630,46 +893,185 @@ class Game:
         #finds the kings locations
         king_location = self.find_king(color)
         for loc in locations:
-            #looks through moves in locations
-            piece = self.get(loc[0], loc[1])
-            #checks if it is a piece and is the opposite color
-            if piece and piece.color == opposite_color:
-                #if the king is in opposite colors valid locations return True
-                if king_location in piece.valid_moves(loc[0], loc[1]):
-                    return True
+            #if the king is in opposite colors valid locations return True
+            if king_location in self.valid_moves(loc[0], loc[1]):
+                return True
         #anything else return False
         return False
 
+    def _targets(self, square: int) -> list[int]:
+        """returns the squares the piece on a square can move to, the same
+        moves as its Piece class without the knight's own square"""
+        squares = self._squares
+        code = squares[square]
+        kind = code & KIND_MASK
+        own = code & BLACK
+        if kind == KNIGHT or kind == KING:
+            table = KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS
+            return [target for target in table[square]
+                    if squares[target] == EMPTY or squares[target] & BLACK != own]
+        if kind == PAWN:
+            rays = [PAWN_PUSHES[own >> 3][square][:1 if code & MOVED else 2]]
+            targets = [target for target in PAWN_CAPTURES[own >> 3][square]
+                       if squares[target] == EMPTY or squares[target] & BLACK != own]
+        else:
+            directions = ORTHOGONAL if kind == ROOK else DIAGONAL if kind == BISHOP else ALL_DIRECTIONS
+            rays = [RAY_SQUARES[direction][square] for direction in directions]
+            targets = []
+        for ray in rays:
+            for target in ray:
+                if squares[target] == EMPTY:
+                    targets.append(target)
+                else:
+                    if squares[target] & BLACK != own:
+                        targets.append(target)
+                    break
+        return targets
+
+    def _checkers(self, king: int, by: int) -> list[tuple[int, list[int]]]:
+        """returns every piece of Color value by attacking the king's square,
+        each with the squares between it and the king that would block it"""
+        squares = self._squares
+        bit = by << 3
+        checkers = []
+        for target in KNIGHT_TARGETS[king]:
+            if squares[target] == KNIGHT | bit:
+                checkers.append((target, []))
+        for target in KING_TARGETS[king]:
+            if squares[target] == KING | bit:
+                checkers.append((target, []))
+        for target in PAWN_CAPTURES[by ^ 1][king]:
+            if squares[target] & ~MOVED == PAWN | bit:
+                checkers.append((target, []))
+        behind = RAY_SQUARES[SOUTH if by == 0 else NORTH][king]
+        if behind:
+            if squares[behind[0]] & ~MOVED == PAWN | bit:
+                checkers.append((behind[0], []))
+            elif squares[behind[0]] == EMPTY and len(behind) > 1 and squares[behind[1]] == PAWN | bit:
+                checkers.append((behind[1], [behind[0]]))
+        for directions, slider in ((ORTHOGONAL, ROOK | bit), (DIAGONAL, BISHOP | bit)):
+            for direction in directions:
+                between = []
+                for target in RAY_SQUARES[direction][king]:
+                    code = squares[target]
+                    if code:
+                        if code == slider or code == QUEEN | bit:
+                            checkers.append((target, between))
+                        break
+                    between.append(target)
+        return checkers
+
+    def _pins(self, king: int, color: int) -> dict:
+        """returns the pieces of Color value color pinned to their king, each
+        with the only squares it may move to (the ray up to and including the pinner)"""
+        squares = self._squares
+        enemy = (color ^ 1) << 3
+        pins = {}
+        for directions, slider in ((ORTHOGONAL, ROOK | enemy), (DIAGONAL, BISHOP | enemy)):
+            for direction in directions:
+                pinned = None
+                ray = set()
+                for target in RAY_SQUARES[direction][king]:
+                    ray.add(target)
+                    code = squares[target]
+                    if code == EMPTY:
+                        continue
+                    if pinned is None and code & BLACK != enemy:
+                        pinned = target
+                    else:
+                        if pinned is not None and (code == slider or code == QUEEN | enemy):
+                            pins[pinned] = ray
+                        break
+        #an unmoved enemy pawn two squares away reaches the king once the square between is left
+        behind = RAY_SQUARES[SOUTH if enemy == 0 else NORTH][king]
+        if len(behind) > 1 and squares[behind[1]] == PAWN | enemy:
+            code = squares[behind[0]]
+            if code and code & BLACK != enemy:
+                pins[behind[0]] = {behind[0], behind[1]}
+        return pins
+
+    def legal_moves(self, color: Color) -> list[tuple[int, int, int, int]]:
+        """returns every legal move of a color as (y, x, y2, x2)
+
+        The checking pieces and pinned pieces are found once, so no move
+        has to be tried on the board or on a copy of it. The knight's own
+        square, which Knight.valid_moves lists, is not a move.
+        """
+        squares = self._squares
+        own = color.value
+        king = self._kings[own]
+        moves = []
+        if king is None:
+            #without a king every move is legal
+            for square in sorted(self._locations[own]):
+                moves += [SQUARE_COORDS[square] + SQUARE_COORDS[target] for target in self._targets(square)]
+            return moves
+        checkers = self._checkers(king, own ^ 1)
+        #the king may go anywhere not attacked once it has left its square
+        king_targets = self._targets(king)
+        king_code = squares[king]
+        squares[king] = EMPTY
+        for target in king_targets:
+            if not self._attacked(target, own ^ 1):
+                moves.append(SQUARE_COORDS[king] + SQUARE_COORDS[target])
+        squares[king] = king_code
+        #only the king can get out of double check
+        if len(checkers) > 1:
+            return moves
+        #out of a single check by taking the checker or stepping in between
+        allowed = None
+        if checkers:
+            allowed = set(checkers[0][1])
+            allowed.add(checkers[0][0])
+        pins = self._pins(king, own)
+        for square in sorted(self._locations[own]):
+            if square == king:
+                continue
+            pin = pins.get(square)
+            for target in self._targets(square):
+                if (allowed is None or target in allowed) and (pin is None or target in pin):
+                    moves.append(SQUARE_COORDS[square] + SQUARE_COORDS[target])
+        return moves
+
+    def is_checkmate(self, color: Color) -> bool:
+        """returns True if the color is in check and has no legal move"""
+        return self.check(color) and not self.legal_moves(color)
+
+    def is_stalemate(self, color: Color) -> bool:
+        """returns True if the color is not in check but has no legal move"""
+        return not self.check(color) and not self.legal_moves(color)
+
     def mate(self, color: Color) -> bool:
         """checks if a player is in check mate"""
-        # if not in check cannot be in check mate
-        if not self.check(color):
-            return False
-
-        # find the king's position
-        king_position = self.find_king(color)
-
-        # check if the king can move out of check
-        king = self.get(king_position[0], king_position[1])
-        for move in king.valid_moves(king_position[0], king_position[1], self):
-            # copy the board to see if a move will place player in checkmate or not
-            board_copy = self.copy_board()
-            board_copy.move(king, king_position[0], king_position[1], move[0], move[1])
-            if not board_copy.check(color):
-                return False
-
-        # check if any piece can block the check or capture the checking piece
-        for loc in self.get_piece_locations(color):
-            piece = self.get(loc[0], loc[1])
-            possible_moves = piece.valid_moves(loc[0], loc[1], self)
-            for move in possible_moves:
-                board_copy = self.copy_board()
-                board_copy.move(piece, loc[0], loc[1], move[0], move[1])
-                if not board_copy.check(color):
-                    return False
+        return self.is_checkmate(color)
 
-        return True
+    def _computer_move(self, depth: int = 3, limits=None):
+        """Searches for the best move of the current player and plays it,
+        returns the message for the side box or False if there is no move
 
-    def _computer_move(self) -> bool:
-        """Selects a random valid move for the computer player"""
-        self.switch_player()
+        limits:
+            a search.SearchLimits on time, nodes or depth. Its depth replaces
+            depth when given, otherwise a time or node budget searches as
+            deep as the budget allows.
+        """
+        #the search plays moves on this game and takes them back again
+        if Game.SEARCH is None:
+            from search import Search
+            from transposition import TranspositionTable
+            Game.SEARCH = Search(TranspositionTable())
+        return self._play_result(Game.SEARCH.search(self, depth, limits))
+
+    def _play_result(self, result):
+        """Plays the move of a search.SearchResult, returns the message for
+        the side box or False if there is no move"""
+        if result.move is None:
+            return False
+        y, x, y2, x2 = result.move
+        piece = self.get(y, x)
+        target = self.get(y2, x2)
+        self.move(piece, y, x, y2, x2)
+        message = piece.color.name + ' moved ' + type(piece).__name__
+        if target:
+            message += ' and captures ' + type(target).__name__
+        return (message + '<br />' + f'(depth {result.depth}, {result.nodes} nodes, '
+                f'{result.nps:.0f} nodes/s)<br />')
@@ -0,0 +1,318 @@
+"""
+Negamax alpha-beta search with iterative deepening for the computer player
+"""
+import time
+import threading
+from evaluation import evaluate, PIECE_VALUES
+from piece_codes import EMPTY, PAWN, QUEEN, KIND_MASK
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from move_ordering import MoveOrderer
+
+#The score of giving checkmate, less the number of plies it takes
+MATE = 100000
+#Larger than any score the search can return
+INFINITY = 1000000
+#Deeper than any search will go, used to recognise mate scores
+MAX_PLY = 128
+#How far a capture may fall short of alpha and still be searched in quiescence
+DELTA_MARGIN = 200
+#How many nodes are searched between looks at the clock
+CHECK_INTERVAL = 256
+
+
+class SearchStopped(Exception):
+    """Raised inside the search when a limit is reached or it is told to stop"""
+
+
+class SearchLimits:
+    """When a search has to stop: after a depth, a number of nodes or a
+    number of seconds, whichever comes first. None means no limit."""
+    def __init__(self, depth: int = None, nodes: int = None, seconds: float = None):
+        """Creates the instance variables
+
+        depth:
+            the deepest iteration to search.
+        nodes:
+            how many nodes, quiescence included, the search may visit.
+        seconds:
+            how long the search may take by the wall clock.
+        """
+        if depth is not None and not 0 < depth < MAX_PLY:
+            raise ValueError('You must provide a valid depth.')
+        if nodes is not None and nodes <= 0:
+            raise ValueError('You must provide a valid node budget.')
+        if seconds is not None and seconds <= 0:
+            raise ValueError('You must provide a valid time budget.')
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+
+    @classmethod
+    def for_clock(cls, remaining: float, increment: float = 0.0, moves_to_go: int = 30,
+                  depth: int = None, nodes: int = None) -> 'SearchLimits':
+        """returns limits that spend a fair share of the time left on the clock
+        for this move, remaining and increment are in seconds"""
+        if remaining <= 0 or increment < 0 or moves_to_go <= 0:
+            raise ValueError('You must provide a valid clock.')
+        #most of the increment comes back every move so it can be spent now,
+        #but never plan to use more than half of what is left
+        seconds = min(remaining / moves_to_go + increment * 0.8, remaining / 2)
+        return cls(depth, nodes, max(seconds, 0.01))
+
+
+class SearchResult:
+    """The outcome of a search: the best move with its score, how deep
+    the search went and how much work it took"""
+    def __init__(self, move, score: int, depth: int, nodes: int, seconds: float, pv: list, qnodes: int = 0):
+        """Creates the instance variables
+
+        move:
+            the best move found as (y, x, y2, x2), None if there is no legal move.
+        score:
+            its score in centipawns for the player to move.
+        depth:
+            the deepest completed iteration.
+        nodes:
+            how many positions were visited, quiescence included.
+        qnodes:
+            how many of those were visited by the quiescence search.
+        seconds:
+            how long the search took.
+        pv:
+            the principal variation, the line of best play starting with move.
+        """
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.qnodes = qnodes
+        self.seconds = seconds
+        self.pv = pv
+
+    @property
+    def nps(self) -> float:
+        """returns the nodes searched per second"""
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def quiescence_share(self) -> float:
+        """returns the share of the nodes spent in the quiescence search"""
+        return self.qnodes / self.nodes if self.nodes else 0.0
+
+    def __str__(self) -> str:
+        """returns a one line report of the search"""
+        return (f'depth {self.depth} score {self.score} nodes {self.nodes} '
+                f'qnodes {self.qnodes} ({self.quiescence_share:.0%}) '
+                f'nps {self.nps:.0f} pv {" ".join(map(str, self.pv))}')
+
+
+class Search:
+    """Finds the best move for the player to move in a Game, playing moves
+    on the game with make_move and taking them back with undo"""
+    def __init__(self, table: TranspositionTable = None, evaluator=None):
+        """Creates the instance variables
+
+        table:
+            the transposition table, kept between searches. None searches
+            without one.
+        evaluator:
+            scores a game for the player to move, evaluation.evaluate when
+            None, or another such as a loaded nnue.Network.
+        ordering:
+            sorts the moves of each node, keeping killers and history between iterations.
+        limits:
+            the limits of the current search.
+        nodes:
+            how many positions the current search has visited, quiescence included.
+        qnodes:
+            how many of those the quiescence search visited.
+        _previous_pv:
+            the principal variation of the last completed iteration,
+            searched first in the next one.
+        _stop:
+            set by stop from any thread to end the search early.
+        _deadline:
+            the perf_counter time the current search has to end by, or None.
+        """
+        self.table = table
+        self.evaluate = evaluator or evaluate
+        self.ordering = MoveOrderer()
+        self.limits = SearchLimits()
+        self.nodes = 0
+        self.qnodes = 0
+        self._previous_pv = []
+        self._stop = threading.Event()
+        self._deadline = None
+
+    def stop(self) -> None:
+        """tells a running search to stop, it can be called from any thread.
+        The search notices within CHECK_INTERVAL nodes, and every search
+        starts with the flag cleared."""
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        """returns True once the search has been told to stop"""
+        return self._stop.is_set()
+
+    def search(self, game, max_depth: int = 3, limits: SearchLimits = None,
+               alpha: int = -INFINITY, beta: int = INFINITY) -> SearchResult:
+        """searches one ply deeper at a time until max_depth or a limit is
+        reached and returns the result of the deepest completed iteration
+
+        limits:
+            when to stop, its depth replaces max_depth when given. With a
+            node or time budget and no depth, the search keeps deepening
+            until the budget runs out.
+        alpha, beta:
+            the window every iteration searches. A score outside it is only
+            a bound and may come without a move, see ParallelSearch.
+        """
+        self._stop.clear()
+        self.limits = limits or SearchLimits()
+        if self.limits.depth is not None:
+            max_depth = self.limits.depth
+        elif self.limits.nodes is not None or self.limits.seconds is not None:
+            max_depth = MAX_PLY - 1
+        self.nodes = 0
+        self.qnodes = 0
+        self._previous_pv = []
+        self.ordering.new_search()
+        start = time.perf_counter()
+        self._deadline = start + self.limits.seconds if self.limits.seconds is not None else None
+        result = SearchResult(None, 0, 0, 0, 0.0, [])
+        #the moves played on the game by an interrupted iteration are taken back
+        played = len(game.prior_state)
+        for depth in range(1, max_depth + 1):
+            try:
+                score, pv = self._negamax(game, depth, alpha, beta, 0, True)
+            except SearchStopped:
+                while len(game.prior_state) > played:
+                    game.undo()
+                break
+            result = SearchResult(pv[0] if pv else None, score, depth, self.nodes,
+                                  time.perf_counter() - start, pv, self.qnodes)
+            self._previous_pv = pv
+            #there is nothing better to find than a forced mate, and with the
+            #full window no move means there is no legal move
+            if abs(score) >= MATE - MAX_PLY or not pv and alpha == -INFINITY and beta == INFINITY:
+                break
+        if result.depth == 0:
+            #stopped before the first iteration finished, any legal move beats none
+            moves = game.legal_moves(game.current_player)
+            if moves:
+                self.ordering.order(game, moves, 0)
+                result = SearchResult(moves[0], self.evaluate(game), 0, self.nodes,
+                                      time.perf_counter() - start, [moves[0]], self.qnodes)
+        #the work of an interrupted iteration still counts
+        result.nodes, result.qnodes = self.nodes, self.qnodes
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def _count_node(self) -> None:
+        """counts a node and raises SearchStopped once a limit is reached"""
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0:
+            if self._stop.is_set():
+                raise SearchStopped()
+            if self._deadline is not None and time.perf_counter() >= self._deadline:
+                raise SearchStopped()
+        if self.limits.nodes is not None and self.nodes > self.limits.nodes:
+            raise SearchStopped()
+
+    def _negamax(self, game, depth: int, alpha: int, beta: int, ply: int, on_pv: bool) -> tuple[int, list]:
+        """returns the score of the position for the player to move and the
+        best line found, searching depth more plies inside the alpha-beta window"""
+        if depth == 0:
+            return self._quiescence(game, alpha, beta, ply), []
+        self._count_node()
+        key = game.hash
+        hash_move = None
+        if self.table is not None:
+            entry = self.table.probe(key)
+            if entry is not None:
+                hash_move, score, stored_depth, bound = entry
+                #a deep enough result whose bound settles this window is used as it is
+                if ply > 0 and stored_depth >= depth:
+                    score = _from_table(score, ply)
+                    if (bound == EXACT or (bound == LOWER and score >= beta)
+                            or (bound == UPPER and score <= alpha)):
+                        return score, [hash_move] if hash_move else []
+        color = game.current_player
+        moves = game.legal_moves(color)
+        if not moves:
+            #checkmate, sooner is worse, or stalemate
+            return (ply - MATE if game.check(color) else 0), []
+        #the move the last iteration thought best goes first, then the hash move
+        pv_move = self._previous_pv[ply] if on_pv and ply < len(self._previous_pv) else None
+        self.ordering.order(game, moves, ply, (pv_move, hash_move))
+        original_alpha = alpha
+        best_pv = []
+        for index, move in enumerate(moves):
+            game.make_move(*move)
+            score, line = self._negamax(game, depth - 1, -beta, -alpha, ply + 1, on_pv and move == pv_move)
+            game.undo()
+            score = -score
+            if score > alpha:
+                alpha = score
+                best_pv = [move] + line
+                if alpha >= beta:
+                    self.ordering.record_cutoff(game, move, ply, depth, index)
+                    break
+        if self.table is not None:
+            bound = LOWER if alpha >= beta else EXACT if alpha > original_alpha else UPPER
+            self.table.store(key, best_pv[0] if best_pv else None, _to_table(alpha, ply), depth, bound)
+        return alpha, best_pv
+
+    def _quiescence(self, game, alpha: int, beta: int, ply: int) -> int:
+        """returns the score of the position once the captures and promotions
+        have played out, so a leaf never misses a piece left hanging"""
+        self._count_node()
+        self.qnodes += 1
+        #the player to move can always choose not to capture
+        stand_pat = self.evaluate(game)
+        if stand_pat >= beta or ply >= MAX_PLY:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        squares = game._squares
+        noisy = []
+        for move in game.legal_moves(game.current_player):
+            y, x, y2, x2 = move
+            victim = squares[y2 * 8 + x2]
+            promotion = squares[y * 8 + x] & KIND_MASK == PAWN and (y2 == 0 or y2 == 7)
+            if victim == EMPTY and not promotion:
+                continue
+            #delta pruning: skip captures that cannot lift the score back to alpha
+            gain = PIECE_VALUES[victim & KIND_MASK] + (PIECE_VALUES[QUEEN] - PIECE_VALUES[PAWN] if promotion else 0)
+            if stand_pat + gain + DELTA_MARGIN <= alpha:
+                continue
+            noisy.append(move)
+        self.ordering.order(game, noisy, ply)
+        for move in noisy:
+            game.make_move(*move)
+            score = -self._quiescence(game, -beta, -alpha, ply + 1)
+            game.undo()
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+
+def _to_table(score: int, ply: int) -> int:
+    """stores mate scores as distance from this position instead of from the root"""
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= MAX_PLY - MATE:
+        return score - ply
+    return score
+
+
+def _from_table(score: int, ply: int) -> int:
+    """turns a stored mate score back into distance from the root"""
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= MAX_PLY - MATE:
+        return score + ply
+    return score
@@ -0,0 +1,41 @@
+"""
+Shared sprite atlas for the chess pieces, every piece of the same
+type and color draws the same surface instead of owning its own copy
+"""
+import pygame as pg
+
+#The size of one piece in the sprite sheet
+SPRITE_SIZE = 105
+
+
+class SpriteAtlas:
+    """Slices the 12 piece images out of the sprite sheet once and
+    hands out the shared surfaces, scaled copies are made once per size"""
+    def __init__(self, spritesheet=None, path: str = "images/pieces.png"):
+        """Creates the instance variables
+
+        _sprites:
+            maps a size to a dictionary of sprite offset to surface.
+        """
+        #loads the sheet if the caller did not already have one
+        if spritesheet is None:
+            spritesheet = pg.image.load(path)
+        self._sprites = {SPRITE_SIZE: {}}
+        #6 piece types across, white on the top row and black on the bottom
+        for y in range(0, 2 * SPRITE_SIZE, SPRITE_SIZE):
+            for x in range(0, 6 * SPRITE_SIZE, SPRITE_SIZE):
+                image = pg.Surface((SPRITE_SIZE, SPRITE_SIZE), pg.SRCALPHA)
+                image.blit(spritesheet, (0, 0), pg.rect.Rect(x, y, SPRITE_SIZE, SPRITE_SIZE))
+                self._sprites[SPRITE_SIZE][(x, y)] = image
+
+    def image(self, sprite: tuple[int, int], size: int = SPRITE_SIZE):
+        """returns the shared surface for a sprite offset, scaling and
+        caching all 12 images the first time a new size is asked for"""
+        if size not in self._sprites:
+            self._sprites[size] = {offset: pg.transform.smoothscale(image, (size, size))
+                                   for offset, image in self._sprites[SPRITE_SIZE].items()}
+        return self._sprites[size][sprite]
+
+    def __len__(self) -> int:
+        """returns how many surfaces the atlas is holding"""
+        return sum(len(images) for images in self._sprites.values())
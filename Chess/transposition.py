@@ -0,0 +1,222 @@
+"""
+Fixed size transposition table for the search, so positions reached
+again through a different move order are not searched again
+"""
+from array import array
+from multiprocessing import shared_memory, resource_tracker
+
+#Bound types of a stored score
+EXACT = 0
+LOWER = 1
+UPPER = 2
+#The replacement policies a table can use
+POLICIES = ('depth', 'always')
+#Each entry is a 64 bit key and 64 bits of packed data
+ENTRY_BYTES = 16
+#Scores are stored offset so they are never negative
+_SCORE_OFFSET = 1 << 31
+
+
+def pack(move, score: int, depth: int, bound: int) -> int:
+    """packs a move (y, x, y2, x2) or None, a score, a depth and a bound into 64 bits
+
+    bits 0-11 the move, bit 12 set when there is a move, bits 13-20 the depth,
+    bits 21-22 the bound and bits 23-54 the score.
+    """
+    data = 0
+    if move is not None:
+        y, x, y2, x2 = move
+        data = y | x << 3 | y2 << 6 | x2 << 9 | 1 << 12
+    return data | depth << 13 | bound << 21 | (score + _SCORE_OFFSET) << 23
+
+
+def unpack(data: int) -> tuple:
+    """returns the (move, score, depth, bound) packed into 64 bits"""
+    move = None
+    if data & 1 << 12:
+        move = (data & 7, data >> 3 & 7, data >> 6 & 7, data >> 9 & 7)
+    return move, (data >> 23) - _SCORE_OFFSET, data >> 13 & 255, data >> 21 & 3
+
+
+class TranspositionTable:
+    """An array backed hash table of search results with two entry buckets.
+
+    With the 'depth' policy the first entry of a bucket keeps the deepest
+    search and the second is always replaced. With 'always' a new entry
+    always goes first and the old first entry moves to second.
+    """
+    def __init__(self, size_mb: int = 16, policy: str = 'depth'):
+        """Creates the instance variables
+
+        _keys, _data:
+            the key and packed data of every entry, allocated once.
+        _mask:
+            picks a bucket from a key, the bucket count is a power of two.
+        """
+        if policy not in POLICIES:
+            raise ValueError('You must provide a valid replacement policy.')
+        self.policy = policy
+        buckets = 1
+        while buckets * 4 * ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self._mask = buckets - 1
+        self.size = buckets * 2
+        self._keys = self._allocate(self.size)
+        self._data = self._allocate(self.size)
+        self.clear()
+
+    def _allocate(self, entries: int):
+        """returns a zeroed array of 64 bit words"""
+        return array('Q', bytes(8 * entries))
+
+    def clear(self) -> None:
+        """empties the table and resets its statistics"""
+        for words in (self._keys, self._data):
+            words[:] = array('Q', bytes(8 * self.size))
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+        self.filled = 0
+
+    def probe(self, key: int):
+        """returns (move, score, depth, bound) stored for a key, or None"""
+        self.probes += 1
+        index = (key & self._mask) << 1
+        for slot in (index, index + 1):
+            if self._keys[slot] == key and self._data[slot]:
+                self.hits += 1
+                return unpack(self._data[slot])
+        if self._data[index] or self._data[index + 1]:
+            #the bucket holds other positions that share its index
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, move, score: int, depth: int, bound: int) -> None:
+        """stores a search result in the key's bucket following the replacement policy"""
+        self.stores += 1
+        index = (key & self._mask) << 1
+        data = pack(move, score, depth, bound)
+        if self._keys[index + 1] == key and self._data[index + 1]:
+            slot = index + 1
+        elif self._keys[index] == key and self._data[index]:
+            slot = index
+        elif self.policy == 'depth':
+            slot = index if depth >= unpack(self._data[index])[2] or not self._data[index] else index + 1
+        else:
+            #the old first entry becomes the second, the new one goes first
+            if not self._data[index + 1] and self._data[index]:
+                self.filled += 1
+            self._keys[index + 1] = self._keys[index]
+            self._data[index + 1] = self._data[index]
+            slot = index
+        if not self._data[slot]:
+            self.filled += 1
+        self._keys[slot] = key
+        self._data[slot] = data
+
+    def stats(self) -> dict:
+        """returns the probes, hits, collisions, stores and how full the table is"""
+        return {'probes': self.probes, 'hits': self.hits,
+                'hit_rate': self.hits / self.probes if self.probes else 0.0,
+                'collisions': self.collisions, 'stores': self.stores,
+                'fill': self.filled / self.size, 'size_mb': self.size * ENTRY_BYTES / (1024 * 1024)}
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """A TranspositionTable whose entries live in a multiprocessing
+    shared_memory block, so search processes on one machine share results.
+
+    There are no locks. Each slot holds key ^ data next to data, and a
+    probe only trusts a slot whose two words XOR back to its key, so an
+    entry torn by two processes storing at once reads as a miss instead
+    of as a wrong result. The statistics count this process only.
+    """
+    def __init__(self, size_mb: int = 16, policy: str = 'depth', name: str = None):
+        """Creates the instance variables
+
+        name:
+            the shared_memory block of a table made in another process to
+            attach to, None creates a new block.
+        _memory:
+            the shared_memory block holding every key and then every data word.
+        """
+        self._memory = None
+        self._name = name
+        super().__init__(size_mb, policy)
+
+    def _allocate(self, entries: int):
+        """returns the next 64 bit words of the shared block, creating or attaching it first"""
+        if self._memory is None:
+            if self._name is None:
+                self._memory = shared_memory.SharedMemory(create=True, size=16 * entries)
+            else:
+                self._memory = shared_memory.SharedMemory(name=self._name)
+                #the process that created the block is the one to unlink it
+                resource_tracker.unregister(self._memory._name, 'shared_memory')
+            self._words = self._memory.buf.cast('Q')
+            return self._words[:entries]
+        return self._words[entries:]
+
+    @property
+    def name(self) -> str:
+        """returns the name other processes attach to the table with"""
+        return self._memory.name
+
+    def clear(self) -> None:
+        """empties the table and resets its statistics, only the creating
+        process empties the shared entries"""
+        if self._name is None:
+            super().clear()
+        else:
+            self.probes = self.hits = self.collisions = self.stores = self.filled = 0
+
+    def close(self) -> None:
+        """detaches this process from the table and frees it if this process made it"""
+        if self._memory is None:
+            return
+        self._keys.release()
+        self._data.release()
+        self._words.release()
+        self._memory.close()
+        if self._name is None:
+            #a forked process that attached shares this tracker and unregistered the block
+            resource_tracker.register(self._memory._name, 'shared_memory')
+            self._memory.unlink()
+        self._memory = None
+
+    def probe(self, key: int):
+        """returns (move, score, depth, bound) stored for a key, or None"""
+        self.probes += 1
+        index = (key & self._mask) << 1
+        for slot in (index, index + 1):
+            data = self._data[slot]
+            if data and self._keys[slot] ^ data == key:
+                self.hits += 1
+                return unpack(data)
+        if self._data[index] or self._data[index + 1]:
+            self.collisions += 1
+        return None
+
+    def store(self, key: int, move, score: int, depth: int, bound: int) -> None:
+        """stores a search result in the key's bucket following the replacement policy"""
+        self.stores += 1
+        index = (key & self._mask) << 1
+        data = pack(move, score, depth, bound)
+        keys, words = self._keys, self._data
+        if words[index + 1] and keys[index + 1] ^ words[index + 1] == key:
+            slot = index + 1
+        elif words[index] and keys[index] ^ words[index] == key:
+            slot = index
+        elif self.policy == 'depth':
+            slot = index if not words[index] or depth >= unpack(words[index])[2] else index + 1
+        else:
+            #the old first entry moves to second with its check word intact
+            first_key, first_data = keys[index], words[index]
+            keys[index + 1] = first_key
+            words[index + 1] = first_data
+            slot = index
+        if not words[slot]:
+            self.filled += 1
+        keys[slot] = key ^ data
+        words[slot] = data
@@ -0,0 +1,295 @@
+"""
+Texel tuning of the evaluation weights: fits the piece values and the
+middlegame and endgame piece-square tables of evaluation so that
+sigmoid(K * score / 400) predicts the results of the games the positions
+came from. The pawn structure term is not tuned and is added as it is.
+
+The positions are streamed from a text file, one per line as a FEN and
+the result of its game for white (1-0, 0-1, 1/2-1/2, 1.0, 0.5 or 0.0)
+separated by ' ; ' or after the FEN's six fields. Every batch is split
+between a pool of processes, each parsing its share into sparse features,
+a few dozen nonzero entries per position. Those are kept in memory after
+the first pass and handed back out to the pool every later epoch, so
+only the sparse arithmetic is repeated; with --no-cache every epoch
+reads and parses the file again.
+
+    python tuner.py positions.txt [--epochs N] [--workers N] [--checkpoint FILE]
+"""
+import os
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from piece_codes import PAWN, KING, KIND_MASK, BLACK
+from fen import position_from_fen
+from pawn_hash import pawn_structure
+import evaluation
+
+#Parameters: a value for each kind, then a middlegame and an endgame
+#table of 64 squares for each kind, laid out as in evaluation
+KINDS = range(PAWN, KING + 1)
+_VALUES = 0
+_MG = len(KINDS)
+_EG = _MG + len(KINDS) * 64
+PARAMETERS = _EG + len(KINDS) * 64
+#The results by how they are written
+RESULTS = {'1-0': 1.0, '0-1': 0.0, '1/2-1/2': 0.5, '1.0': 1.0, '0.0': 0.0, '0.5': 0.5}
+#How many positions are read from disk at a time
+BATCH = 65536
+
+
+def initial_parameters() -> np.ndarray:
+    """returns the weights evaluation uses now as a parameter vector"""
+    params = np.zeros(PARAMETERS)
+    for index, kind in enumerate(KINDS):
+        params[_VALUES + index] = evaluation.PIECE_VALUES[kind]
+        params[_MG + index * 64:_MG + (index + 1) * 64] = evaluation.MG_TABLES[kind]
+        params[_EG + index * 64:_EG + (index + 1) * 64] = evaluation.EG_TABLES[kind]
+    return params
+
+
+def parse(line: str):
+    """returns the 65 byte position and the result of a dataset line, or None for a blank line"""
+    line = line.strip()
+    if not line:
+        return None
+    if ';' in line:
+        fen, result = line.rsplit(';', 1)
+    else:
+        fields = line.split()
+        fen, result = ' '.join(fields[:-1]), fields[-1]
+    result = result.strip().strip('"[]')
+    if result not in RESULTS:
+        raise ValueError('You must provide a valid game result.')
+    return position_from_fen(fen), RESULTS[result]
+
+
+def stream(path: str, batch: int = BATCH):
+    """yields lists of at most batch non blank dataset lines read from path"""
+    lines = []
+    with open(path) as dataset:
+        for line in dataset:
+            if not line.strip():
+                continue
+            lines.append(line)
+            if len(lines) == batch:
+                yield lines
+                lines = []
+    if lines:
+        yield lines
+
+
+def features(positions: list) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """returns the nonzero entries of the feature matrix of 65 byte positions
+    as (rows, columns, weights), so that adding up weight times parameter by
+    row gives each position's score for white. Each piece has three entries:
+    its value, its middlegame square and its endgame square."""
+    codes = np.frombuffer(b''.join(positions), dtype=np.uint8).reshape(-1, 65)[:, :64].astype(np.intp)
+    kinds = codes & KIND_MASK
+    black = (codes & BLACK) != 0
+    phase = np.minimum(np.array(evaluation.PHASES)[codes].sum(axis=1), evaluation.PHASE_TOTAL)
+    middlegame = phase / evaluation.PHASE_TOTAL
+    rows, square = np.nonzero(kinds)
+    kind_index = kinds[rows, square] - PAWN
+    is_black = black[rows, square]
+    sign = np.where(is_black, -1.0, 1.0)
+    #white reads the tables upside down, with y = 0 on the last row
+    y, x = square // 8, square % 8
+    table = kind_index * 64 + np.where(is_black, y * 8 + x, (7 - y) * 8 + x)
+    #material counts in full whatever the phase
+    columns = np.concatenate([_VALUES + kind_index, _MG + table, _EG + table])
+    weights = np.concatenate([sign, sign * middlegame[rows], sign * (1 - middlegame[rows])])
+    return np.tile(rows, 3).astype(np.int32), columns.astype(np.int32), weights.astype(np.float32)
+
+
+def prepare(lines: list) -> tuple:
+    """returns a shard of dataset lines ready for _gradient: the sparse
+    features, the pawn structure score, which is not tuned and is added as
+    it is, and the result of every position"""
+    parsed = [parse(line) for line in lines]
+    positions = [position for position, _ in parsed]
+    fixed = np.array([pawn_structure(position[:64])[0] for position in positions], dtype=np.float32)
+    results = np.array([result for _, result in parsed], dtype=np.float32)
+    return features(positions), fixed, results
+
+
+def _gradient(shard: tuple, params: np.ndarray, k: float) -> tuple[float, np.ndarray, int]:
+    """returns the summed squared error, its gradient and the number of positions of a prepared shard"""
+    (rows, columns, weights), fixed, results = shard
+    count = len(results)
+    scores = np.bincount(rows, weights * params[columns], minlength=count) + fixed
+    predicted = 1 / (1 + 10 ** (-k * scores / 400))
+    error = predicted - results
+    slope = 2 * error * predicted * (1 - predicted) * k * math.log(10) / 400
+    return float((error ** 2).sum()), np.bincount(columns, weights * slope[rows], minlength=PARAMETERS), count
+
+
+def _line_gradient(lines: list, params: np.ndarray, k: float) -> tuple[float, np.ndarray, int]:
+    """returns what _gradient does for dataset lines that were not prepared"""
+    return _gradient(prepare(lines), params, k)
+
+
+def _prepare_gradient(lines: list, params: np.ndarray, k: float) -> tuple:
+    """returns the prepared shard of dataset lines, to be cached, and its _gradient"""
+    shard = prepare(lines)
+    return shard, _gradient(shard, params, k)
+
+
+class Tuner:
+    """Fits the evaluation parameters to a dataset by gradient descent with
+    Adam, over a pool of worker processes"""
+    def __init__(self, path: str, workers: int = None, k: float = 1.0, rate: float = 1.0,
+                 checkpoint: str = None, checkpoint_every: int = 1, cache: bool = True):
+        """Creates the instance variables
+
+        path:
+            the dataset, read on the first epoch and, without cache, on
+            every epoch after it.
+        workers:
+            how many processes share each batch, every core when None.
+        k:
+            scales scores before the sigmoid, see fit_k.
+        rate:
+            the Adam step size in centipawns.
+        checkpoint, checkpoint_every:
+            the .npz file the parameters are saved to every so many epochs,
+            and read from to carry on if it exists.
+        cache:
+            keeps the prepared dataset in memory after the first pass
+            instead of parsing the file every epoch.
+        params:
+            the parameter vector being tuned.
+        """
+        if workers is not None and workers < 1:
+            raise ValueError('You must provide a valid number of workers.')
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.k = k
+        self.rate = rate
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.cache = cache
+        #the prepared shards of the whole dataset once it has been read
+        self._prepared = None
+        self.params = initial_parameters()
+        self.epoch = 0
+        #the Adam moment estimates
+        self._mean = np.zeros(PARAMETERS)
+        self._square = np.zeros(PARAMETERS)
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self.load(checkpoint)
+
+    def _shards(self, positions: list) -> list:
+        """splits a batch into one share per worker"""
+        size = -(-len(positions) // self.workers)
+        return [positions[start:start + size] for start in range(0, len(positions), size)]
+
+    def error(self, pool: ProcessPoolExecutor, params: np.ndarray = None, k: float = None) -> tuple[float, np.ndarray]:
+        """returns the mean squared error over the dataset and its gradient"""
+        params = self.params if params is None else params
+        k = self.k if k is None else k
+        total, gradient, count = 0.0, np.zeros(PARAMETERS), 0
+        for shard_error, shard_gradient, shard_count in self._gradients(pool, params, k):
+            total += shard_error
+            gradient += shard_gradient
+            count += shard_count
+        if count == 0:
+            raise ValueError('You must provide a dataset with positions.')
+        return total / count, gradient / count
+
+    def _gradients(self, pool: ProcessPoolExecutor, params: np.ndarray, k: float):
+        """yields the error, gradient and count of every shard of the dataset"""
+        if self._prepared is not None:
+            #the cached shards are handed out to the pool like fresh ones
+            yield from pool.map(_gradient, self._prepared, [params] * len(self._prepared),
+                                [k] * len(self._prepared))
+            return
+        prepared = []
+        for lines in stream(self.path):
+            shards = self._shards(lines)
+            if not self.cache:
+                yield from pool.map(_line_gradient, shards, [params] * len(shards), [k] * len(shards))
+                continue
+            for shard, result in pool.map(_prepare_gradient, shards, [params] * len(shards), [k] * len(shards)):
+                prepared.append(shard)
+                yield result
+        if self.cache:
+            self._prepared = prepared
+
+    def fit_k(self, pool: ProcessPoolExecutor, low: float = 0.2, high: float = 3.0, steps: int = 15) -> float:
+        """sets k to the value that gives the current parameters the least error"""
+        errors = {k: self.error(pool, k=k)[0] for k in np.linspace(low, high, steps)}
+        self.k = float(min(errors, key=errors.get))
+        return self.k
+
+    def step(self, pool: ProcessPoolExecutor) -> float:
+        """runs one epoch of Adam over the dataset and returns the error before it"""
+        error, gradient = self.error(pool)
+        self.epoch += 1
+        self._mean = 0.9 * self._mean + 0.1 * gradient
+        self._square = 0.999 * self._square + 0.001 * gradient ** 2
+        mean = self._mean / (1 - 0.9 ** self.epoch)
+        square = self._square / (1 - 0.999 ** self.epoch)
+        self.params -= self.rate * mean / (np.sqrt(square) + 1e-12)
+        return error
+
+    def run(self, epochs: int, report=print) -> np.ndarray:
+        """tunes for a number of epochs, checkpointing as it goes, and returns the parameters"""
+        with ProcessPoolExecutor(self.workers) as pool:
+            for _ in range(epochs):
+                error = self.step(pool)
+                report(f'epoch {self.epoch}: error {error:.6f}')
+                if self.checkpoint is not None and self.epoch % self.checkpoint_every == 0:
+                    self.save(self.checkpoint)
+        if self.checkpoint is not None:
+            self.save(self.checkpoint)
+        return self.params
+
+    def save(self, path: str) -> None:
+        """writes the parameters, k, the epoch and the Adam state to path"""
+        np.savez(path, params=self.params, k=self.k, epoch=self.epoch, mean=self._mean, square=self._square)
+        #np.savez adds .npz when it is missing
+        if not path.endswith('.npz') and os.path.exists(path + '.npz'):
+            os.replace(path + '.npz', path)
+
+    def load(self, path: str) -> None:
+        """carries on from a checkpoint written by save"""
+        with np.load(path) as saved:
+            if saved['params'].shape != (PARAMETERS,):
+                raise ValueError('You must provide a valid checkpoint.')
+            self.params = saved['params'].astype(float)
+            self.k = float(saved['k'])
+            self.epoch = int(saved['epoch'])
+            self._mean = saved['mean']
+            self._square = saved['square']
+
+
+def install(params: np.ndarray) -> None:
+    """puts tuned parameters into evaluation in place. Games made before
+    keep their old totals until their board is replaced."""
+    values = np.rint(params).astype(int)
+    for index, kind in enumerate(KINDS):
+        if kind != KING:
+            evaluation.PIECE_VALUES[kind] = int(values[_VALUES + index])
+        evaluation.MG_TABLES[kind][:] = values[_MG + index * 64:_MG + (index + 1) * 64].tolist()
+        evaluation.EG_TABLES[kind][:] = values[_EG + index * 64:_EG + (index + 1) * 64].tolist()
+    evaluation.rebuild_scores()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Tune the evaluation weights on labelled positions.')
+    parser.add_argument('path')
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--rate', type=float, default=1.0)
+    parser.add_argument('--checkpoint', default='tuned.npz')
+    parser.add_argument('--checkpoint-every', type=int, default=10)
+    parser.add_argument('--fit-k', action='store_true', help='fit K to the starting weights first')
+    parser.add_argument('--no-cache', action='store_true', help='parse the dataset again every epoch')
+    args = parser.parse_args()
+    tuner = Tuner(args.path, args.workers, rate=args.rate, checkpoint=args.checkpoint,
+                  checkpoint_every=args.checkpoint_every, cache=not args.no_cache)
+    if args.fit_k:
+        with ProcessPoolExecutor(tuner.workers) as pool:
+            print(f'K = {tuner.fit_k(pool):.3f}')
+    tuner.run(args.epochs)
@@ -0,0 +1,35 @@
+"""
+64 bit Zobrist keys for hashing positions, drawn from a fixed seed so
+a position hashes the same in every process and every run
+"""
+import random
+from piece_codes import PAWN, KIND_MASK, MOVED
+
+#The seed every key is drawn from, changing it changes every hash
+SEED = 20230418
+
+_random = random.Random(SEED)
+#One key per piece code (see piece_codes) per square, the empty code hashes to 0.
+#Pawns that have moved have their own codes and so their own keys.
+PIECE_KEYS = [[0] * 64] + [[_random.getrandbits(64) for _ in range(64)] for _ in range(1, 32)]
+#Mixed in when black is the player to move
+SIDE_KEY = _random.getrandbits(64)
+#The keys of the pawns alone for the pawn hash, a pawn hashes the same
+#whether or not it has moved and every other piece hashes to 0
+PAWN_KEYS = [PIECE_KEYS[code & ~MOVED] if code & KIND_MASK == PAWN else PIECE_KEYS[0] for code in range(32)]
+
+
+def position_hash(squares, black_to_move: bool) -> int:
+    """returns the hash of 64 piece codes and the player to move from scratch"""
+    key = SIDE_KEY if black_to_move else 0
+    for square, code in enumerate(squares):
+        key ^= PIECE_KEYS[code][square]
+    return key
+
+
+def pawn_hash(squares) -> int:
+    """returns the hash of the pawns among 64 piece codes from scratch"""
+    key = 0
+    for square, code in enumerate(squares):
+        key ^= PAWN_KEYS[code][square]
+    return key